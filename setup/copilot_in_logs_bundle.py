@@ -23,9 +23,155 @@
 # The script should create .github/prompts/analyze.prompt.md file
 # with content from dedicated function
 #
+# Feature #004
+# With --index the script streams every log file of the bundle once
+# (plain, gzip, or members of zip archives) and writes .github/logs-index.jsonl:
+# one line per file with size, line count, first/last timestamp,
+# severity counts and the most frequent error signatures.
+# Files unchanged since the previous run (same size and mtime) are not read again.
+#
+# Feature #005
+# With --extract the script unpacks nested zip/tar/tar.gz archives of the bundle,
+# each one into a directory named after it, across a pool of worker processes.
+# Members are streamed to disk in fixed-size chunks, members that would land
+# outside the target directory are refused, and members already on disk
+# (same size and CRC32 for zip, same size and mtime for tar) are not written again.
+# Archives are never modified; extracted archives are recorded in .github/extracted.json.
+#
+# Feature #006
+# With --upgrades the script parses every JSON file under upgrade-analytics
+# in parallel, streaming the lists of each file item by item, and writes an
+# upgrade timeline and a failure table into README.md between generated-section
+# markers.
+# Keys are matched by name variants (startTime, start_time, StartedAt...),
+# so summaries from different versions are understood.
+# Rerunning replaces the section, the rest of README.md is left untouched.
+#
+# Feature #007
+# With --timeline the script k-way merges all logs of the bundle by timestamp
+# into .github/timeline ("timestamp<TAB>source<TAB>line" per line) and writes
+# .github/timeline.idx with the byte offset of every minute.
+# Lines without a timestamp (stack traces) follow the previous line of their file.
+# Only one line per file is held in memory; with more files than allowed
+# open at once, batches are merged into temporary runs first.
+# --window START END (or --around TIME) prints a time range using the offsets,
+# without reading the timeline from the beginning.
+#
+# Feature #008
+# With --cluster the script reads every ERROR/FATAL/CRITICAL line of the bundle
+# in one streaming pass and groups them into templates in the style of Drain:
+# variables are masked, lines are routed through a fixed-depth prefix tree by
+# token count and leading tokens, and joined to the most similar template,
+# whose differing tokens become <*>.
+# The ranked templates (count, first/last seen, example lines) are written
+# into README.md between generated-section markers.
+#
+# Feature #009
+# With --search-index the script builds a trigram index of the bundle in
+# .github/search: logs are cut into ~1 MiB blocks at line boundaries and every
+# segment file maps each (lowercased) trigram to the blocks containing it.
+# New or changed files (by size and mtime) are added as a new segment on the
+# next run; the index is rebuilt once more files changed than are still valid.
+# --search PATTERN (literal, or a regex with --regex) memory-maps the segments,
+# intersects the postings of the pattern's trigrams and prints file:line hits
+# from the candidate blocks only.
+#
 
+import argparse
+import bisect
+import functools
+import gzip
+import heapq
+import io
+import json
+import mmap
+import os
+import re
+import resource
+import shutil
+import struct
+import sys
+import tarfile
+import zipfile
+import zlib
+from array import array
+from collections import Counter
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, as_completed, wait
+from datetime import datetime, timedelta, timezone
+from itertools import groupby, islice
+from operator import itemgetter
 from pathlib import Path
 
+GITHUB_DIR = ".github"
+README_FILE = "README.md"
+LOG_INDEX_FILE = ".github/logs-index.jsonl"
+EXTRACT_MANIFEST_FILE = ".github/extracted.json"
+TIMELINE_FILE = ".github/timeline"
+TIMELINE_INDEX_FILE = ".github/timeline.idx"
+SEARCH_INDEX_DIR = ".github/search"
+SEARCH_MANIFEST_FILE = "manifest.json"
+SEARCH_BLOCK_SIZE = 1024 * 1024
+SEARCH_SEGMENT_MAX_POSTINGS = 20_000_000
+# segment files: "<name>.tri" header, offsets[keys + 1] (uint64), keys (uint32), postings (uint32)
+# and "<name>.docs" with one record per block
+SEARCH_SEGMENT_HEADER = struct.Struct("=8sQ")
+SEARCH_SEGMENT_MAGIC = b"TRIGRAM1"
+SEARCH_DOC_RECORD = struct.Struct("=IQII")  # file id, offset, length, first line
+ARCHIVE_SUFFIXES = (".tar.gz", ".tgz", ".tar", ".zip")
+COPY_CHUNK_SIZE = 1024 * 1024
+# files generated by this script, never part of the bundle
+GENERATED_FILES = {README_FILE}
+SNIFF_SIZE = 8192
+MAX_SIGNATURES_PER_FILE = 10
+MAX_TRACKED_SIGNATURES = 5000
+JSON_CHUNK_SIZE = 1024 * 1024
+# reading a log can fail on the file itself or on its compression: a truncated
+# .gz raises EOFError, a corrupt one zlib.error, a broken zip BadZipFile, a zip
+# member in an unsupported method (deflate64) NotImplementedError and an
+# encrypted one RuntimeError
+READ_ERRORS = (OSError, EOFError, zipfile.BadZipFile, zlib.error, NotImplementedError, RuntimeError)
+UPGRADE_ANALYTICS_DIR = "upgrade-analytics"
+MAX_CELL_CHARS = 200
+
+# upgrade-analytics key variants, compared lowercased without "_", "-" and spaces
+UPGRADE_KEYS = {
+    "start": ("starttime", "startedat", "start", "started", "begintime", "begin", "timestamp", "time", "date"),
+    "end": ("endtime", "endedat", "end", "finishtime", "finishedat", "finished", "completedat", "completiontime"),
+    "status": ("status", "result", "state", "outcome", "upgradestatus", "upgraderesult"),
+    "from_version": ("fromversion", "sourceversion", "currentversion", "oldversion", "from"),
+    "to_version": ("toversion", "targetversion", "newversion", "version", "to"),
+    "step": ("failedstep", "failedstage", "failedphase", "currentstep", "step", "stage", "phase"),
+    "error": ("errormessage", "error", "failurereason", "failure", "exception", "reason", "message"),
+}
+DRAIN_DEPTH = 4
+DRAIN_SIMILARITY = 0.5
+DRAIN_MAX_CHILDREN = 100
+DRAIN_MAX_TOKENS = 64
+MAX_CLUSTERS = 10000
+MAX_CLUSTER_EXAMPLES = 3
+MAX_REPORTED_CLUSTERS = 50
+WILDCARD = "<*>"
+FAILED_STATUS_WORDS = ("fail", "error", "abort", "rollback", "rolledback", "timeout", "cancel")
+
+TIMESTAMP_PATTERN = re.compile(
+    r"(\d{4}-\d{2}-\d{2})[T ](\d{2}:\d{2}:\d{2})(?:[.,](\d{1,6}))?"
+)
+SEVERITY_PATTERN = re.compile(
+    r"\b(FATAL|CRITICAL|ERROR|WARNING|WARN|INFO|DEBUG|TRACE"
+    r"|Fatal|Critical|Error|Warning|Information|Info|Debug|Trace)\b"
+)
+SEVERITY_ALIASES = {"WARNING": "WARN", "INFORMATION": "INFO"}
+ERROR_SEVERITIES = {"FATAL", "CRITICAL", "ERROR"}
+# variable parts of a log line, replaced so repeated errors share one signature
+MASK_PATTERNS = [
+    (TIMESTAMP_PATTERN, "<TS>"),
+    (re.compile(r"\b[0-9a-fA-F]{8}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{4}-[0-9a-fA-F]{12}\b"), "<GUID>"),
+    (re.compile(r"\b\d{1,3}(?:\.\d{1,3}){3}(?::\d+)?\b"), "<IP>"),
+    (re.compile(r"\b0x[0-9a-fA-F]+\b|\b[0-9a-fA-F]{16,}\b"), "<HEX>"),
+    (re.compile(r"(?:/[\w.-]+){2,}"), "<PATH>"),
+    (re.compile(r"\b\d+(?:\.\d+)?\b"), "<N>"),
+]
+
 
 def create_directory_if_not_exists(directory_path):
     """Create directory if it doesn't exist."""
@@ -136,8 +282,1260 @@ def setup_github_structure():
     )
 
 
+def is_archive(name):
+    """Archives are unpacked, not indexed."""
+    return name.endswith(ARCHIVE_SUFFIXES)
+
+
+def iter_bundle_files(root="."):
+    """Yield the relative path of every bundle file, generated files excluded."""
+    for directory, subdirectories, files in os.walk(root):
+        subdirectories[:] = sorted(d for d in subdirectories if d not in (GITHUB_DIR, ".git"))
+        for name in sorted(files):
+            path = os.path.relpath(os.path.join(directory, name), root)
+            if path not in GENERATED_FILES:
+                yield path
+
+
+def archive_extract_dir(archive_path):
+    """Directory an archive is extracted into: its path without the archive suffix."""
+    for suffix in ARCHIVE_SUFFIXES:
+        if archive_path.endswith(suffix):
+            return archive_path[: -len(suffix)]
+    raise ValueError(f"{archive_path} is not an archive")
+
+
+def safe_member_path(dest_dir, member_name):
+    """Return where a member is extracted, or None if it would escape dest_dir."""
+    dest_dir = os.path.realpath(dest_dir)
+    target = os.path.realpath(os.path.join(dest_dir, member_name))
+    if target == dest_dir or os.path.commonpath([dest_dir, target]) != dest_dir:
+        return None
+    return target
+
+
+def file_crc32(file_path):
+    crc = 0
+    with open(file_path, "rb") as f:
+        while chunk := f.read(COPY_CHUNK_SIZE):
+            crc = zlib.crc32(chunk, crc)
+    return crc
+
+
+def write_member(source, target, mtime=None):
+    """Stream a member to disk through a temp file, COPY_CHUNK_SIZE at a time."""
+    os.makedirs(os.path.dirname(target), exist_ok=True)
+    tmp_path = f"{target}.part"
+    with open(tmp_path, "wb") as f:
+        shutil.copyfileobj(source, f, COPY_CHUNK_SIZE)
+    if mtime is not None:
+        os.utime(tmp_path, (mtime, mtime))
+    os.replace(tmp_path, target)
+
+
+def extract_zip(archive_path, dest_dir):
+    counts = Counter()
+    with zipfile.ZipFile(archive_path) as archive:
+        for member in archive.infolist():
+            if member.is_dir():
+                continue
+            target = safe_member_path(dest_dir, member.filename)
+            if target is None:
+                counts["refused"] += 1
+                continue
+            if (
+                os.path.isfile(target)
+                and os.path.getsize(target) == member.file_size
+                and file_crc32(target) == member.CRC
+            ):
+                counts["skipped"] += 1
+                continue
+            with archive.open(member) as source:
+                write_member(source, target)
+            counts["extracted"] += 1
+    return counts
+
+
+def extract_tar(archive_path, dest_dir):
+    counts = Counter()
+    # stream mode reads the archive sequentially, one member at a time
+    with tarfile.open(archive_path, "r|*") as archive:
+        for member in archive:
+            if not member.isfile():
+                # links and devices are not needed to read logs
+                continue
+            target = safe_member_path(dest_dir, member.name)
+            if target is None:
+                counts["refused"] += 1
+                continue
+            if (
+                os.path.isfile(target)
+                and os.path.getsize(target) == member.size
+                and int(os.path.getmtime(target)) == int(member.mtime)
+            ):
+                counts["skipped"] += 1
+                continue
+            write_member(archive.extractfile(member), target, member.mtime)
+            counts["extracted"] += 1
+    return counts
+
+
+def extract_archive(archive_path):
+    """Extract one archive next to itself. Runs in a worker process."""
+    extract = extract_zip if archive_path.endswith(".zip") else extract_tar
+    try:
+        return extract(archive_path, archive_extract_dir(archive_path)), None
+    except READ_ERRORS + (tarfile.TarError,) as e:
+        # the archive is failed, the other archives are still extracted
+        return None, f"{type(e).__name__}: {e}"
+
+
+def load_json_file(file_path, default):
+    if not Path(file_path).exists():
+        return default
+    return json.loads(Path(file_path).read_text(encoding="utf-8"))
+
+
+def extract_bundle(root=".", workers=None, manifest_file=EXTRACT_MANIFEST_FILE):
+    """Extract every archive of the bundle, rescanning for archives nested in the extracted ones."""
+    manifest = load_json_file(manifest_file, {})
+    seen = set()
+    totals = Counter()
+    create_directory_if_not_exists(GITHUB_DIR)
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            pending = {}
+            for path in iter_bundle_files(root):
+                if not is_archive(path) or path in seen:
+                    continue
+                seen.add(path)
+                full_path = os.path.join(root, path)
+                stat = os.stat(full_path)
+                record = {"size": stat.st_size, "mtime": stat.st_mtime}
+                if manifest.get(path) == record and os.path.isdir(archive_extract_dir(full_path)):
+                    totals["unchanged archives"] += 1
+                    continue
+                pending[pool.submit(extract_archive, full_path)] = (path, record)
+            if not pending:
+                break
+
+            for future in as_completed(pending):
+                path, record = pending[future]
+                counts, error = future.result()
+                if error:
+                    print(f"Failed to extract {path}: {error}")
+                    totals["failed archives"] += 1
+                    continue
+                if counts["refused"]:
+                    print(f"Refused {counts['refused']} members of {path} pointing outside its directory")
+                totals.update(counts)
+                manifest[path] = record
+            write_text_atomic(manifest_file, json.dumps(manifest, indent=2, sort_keys=True))
+
+    summary = ", ".join(f"{count} {name}" for name, count in sorted(totals.items())) or "nothing to do"
+    print(f"Extraction: {summary}")
+    return totals
+
+
+def open_log_stream(binary_stream, name):
+    """Wrap a binary stream as text, gunzipping it transparently."""
+    if name.endswith(".gz"):
+        binary_stream = gzip.GzipFile(fileobj=binary_stream)
+    return io.TextIOWrapper(io.BufferedReader(binary_stream), encoding="utf-8", errors="replace")
+
+
+class ZipMemberStream(io.TextIOWrapper):
+    """Text stream of one zip member that also closes its archive."""
+
+    def __init__(self, archive_path, member):
+        self.archive = zipfile.ZipFile(archive_path)
+        binary_stream = self.archive.open(member)
+        if member.endswith(".gz"):
+            binary_stream = gzip.GzipFile(fileobj=binary_stream)
+        super().__init__(io.BufferedReader(binary_stream), encoding="utf-8", errors="replace")
+
+    def close(self):
+        super().close()
+        self.archive.close()
+
+
+def iter_log_sources(root="."):
+    """Yield (source, opener) for every log; zip members are named "archive.zip!member"."""
+    for path in iter_bundle_files(root):
+        full_path = os.path.join(root, path)
+        if path.endswith(".zip"):
+            if os.path.isdir(archive_extract_dir(full_path)):
+                # already extracted, its members are indexed from disk
+                continue
+            try:
+                with zipfile.ZipFile(full_path) as archive:
+                    members = [m.filename for m in archive.infolist() if not m.is_dir()]
+            except zipfile.BadZipFile:
+                print(f"Skipping {path}: not a valid zip archive")
+                continue
+            for member in members:
+                if not is_archive(member):
+                    source = f"{path}!{member}"
+                    yield source, functools.partial(open_source, root, source)
+        elif not is_archive(path):
+            yield path, functools.partial(open_source, root, path)
+
+
+def open_source(root, source):
+    """Open a log named as iter_log_sources names it, as a text stream."""
+    if "!" in source:
+        archive_path, member = source.split("!", 1)
+        return ZipMemberStream(os.path.join(root, archive_path), member)
+    full_path = os.path.join(root, source)
+    return open_log_stream(open(full_path, "rb"), full_path)
+
+
+def source_stat(root, source):
+    """Size and mtime of the file holding a log (the archive for zip members)."""
+    stat = os.stat(os.path.join(root, source.split("!", 1)[0]))
+    return {"size": stat.st_size, "mtime": stat.st_mtime}
+
+
+def is_text(stream):
+    """Peek at the start of the stream; NUL bytes mean binary content."""
+    return b"\0" not in stream.buffer.peek(SNIFF_SIZE)[:SNIFF_SIZE]
+
+
+def parse_timestamp(line):
+    """Return the first timestamp of the line as sortable "YYYY-MM-DDTHH:MM:SS.ffffff", or None."""
+    match = TIMESTAMP_PATTERN.search(line)
+    if not match:
+        return None
+    date, time_of_day, fraction = match.groups()
+    return f"{date}T{time_of_day}.{(fraction or '').ljust(6, '0')}"
+
+
+def parse_severity(line):
+    """Return the normalized severity of the line, or None."""
+    match = SEVERITY_PATTERN.search(line)
+    if not match:
+        return None
+    severity = match.group(1).upper()
+    return SEVERITY_ALIASES.get(severity, severity)
+
+
+def mask_line(line):
+    """Replace variable tokens (timestamps, ids, addresses, numbers) with placeholders."""
+    for pattern, placeholder in MASK_PATTERNS:
+        line = pattern.sub(placeholder, line)
+    return line.strip()
+
+
+def index_log_stream(lines):
+    """Read lines once, return line count, time range, severity counts and error signatures."""
+    line_count = 0
+    first_ts = last_ts = None
+    severities = Counter()
+    signatures = Counter()
+    for line in lines:
+        line_count += 1
+        timestamp = parse_timestamp(line)
+        if timestamp:
+            first_ts = first_ts or timestamp
+            last_ts = timestamp
+        severity = parse_severity(line)
+        if not severity:
+            continue
+        severities[severity] += 1
+        if severity in ERROR_SEVERITIES:
+            signatures[mask_line(line)[:300]] += 1
+            # bound memory on files with endless distinct errors
+            if len(signatures) > MAX_TRACKED_SIGNATURES:
+                signatures = Counter(dict(signatures.most_common(MAX_TRACKED_SIGNATURES // 2)))
+
+    return {
+        "lines": line_count,
+        "first_ts": first_ts,
+        "last_ts": last_ts,
+        "severity": dict(severities),
+        "signatures": signatures.most_common(MAX_SIGNATURES_PER_FILE),
+    }
+
+
+def load_log_index(index_file=LOG_INDEX_FILE):
+    """Return {source: entry} from a previous index, empty if there is none."""
+    entries = {}
+    if not Path(index_file).exists():
+        return entries
+    with open(index_file, "r", encoding="utf-8") as f:
+        for line in f:
+            entry = json.loads(line)
+            entries[entry["source"]] = entry
+    return entries
+
+
+def write_text_atomic(file_path, content):
+    """Replace file content in one step, so an interrupted run leaves the old file."""
+    tmp_path = f"{file_path}.tmp"
+    Path(tmp_path).write_text(content, encoding="utf-8")
+    os.replace(tmp_path, file_path)
+
+
+def build_log_index(root=".", index_file=LOG_INDEX_FILE):
+    """Index every log of the bundle, reusing entries of files unchanged since the last run."""
+    previous = load_log_index(index_file)
+    entries = []
+    reused = 0
+    for source, opener in iter_log_sources(root):
+        stat = os.stat(os.path.join(root, source.split("!", 1)[0]))
+        old_entry = previous.get(source)
+        if old_entry and old_entry["size"] == stat.st_size and old_entry["mtime"] == stat.st_mtime:
+            entries.append(old_entry)
+            reused += 1
+            continue
+
+        try:
+            with opener() as stream:
+                if not is_text(stream):
+                    continue
+                summary = index_log_stream(stream)
+        except READ_ERRORS as e:
+            print(f"Skipping {source}: {e}")
+            continue
+        entries.append({"source": source, "size": stat.st_size, "mtime": stat.st_mtime, **summary})
+
+    create_directory_if_not_exists(GITHUB_DIR)
+    write_text_atomic(index_file, "".join(json.dumps(entry) + "\n" for entry in entries))
+    print(f"Indexed {len(entries)} log files ({reused} unchanged) into {index_file}")
+    return entries
+
+
+def normalize_key(key):
+    return re.sub(r"[\s_\-.]", "", str(key)).lower()
+
+
+def flatten_fields(document, depth=2):
+    """Map normalized key -> scalar value; outer keys win over nested ones."""
+    fields = {}
+    nested = []
+    for key, value in document.items():
+        if isinstance(value, dict):
+            nested.append(value)
+        elif not isinstance(value, list) and value not in (None, ""):
+            fields.setdefault(normalize_key(key), value)
+    if depth > 1:
+        for value in nested:
+            for key, nested_value in flatten_fields(value, depth - 1).items():
+                fields.setdefault(key, nested_value)
+    return fields
+
+
+def pick_field(fields, name):
+    for key in UPGRADE_KEYS[name]:
+        if key in fields:
+            return fields[key]
+    return None
+
+
+def normalize_time(value):
+    """Return a sortable "YYYY-MM-DDTHH:MM:SS.ffffff" for timestamp strings and epoch numbers."""
+    if isinstance(value, (int, float)) and not isinstance(value, bool) and value > 1e9:
+        seconds = value / 1000 if value > 1e12 else value
+        return datetime.fromtimestamp(seconds, timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%f")
+    return parse_timestamp(str(value)) if value is not None else None
+
+
+def is_failed_status(status, error):
+    if status is None:
+        return error is not None
+    status = normalize_key(status)
+    return any(word in status for word in FAILED_STATUS_WORDS)
+
+
+def upgrade_attempt(document, source):
+    """Return the attempt described by a JSON object, or None if it does not look like one."""
+    fields = flatten_fields(document)
+    start = normalize_time(pick_field(fields, "start"))
+    if start is None:
+        return None
+    status = pick_field(fields, "status")
+    error = pick_field(fields, "error")
+    return {
+        "source": source,
+        "start": start,
+        "end": normalize_time(pick_field(fields, "end")),
+        "status": str(status) if status is not None else "unknown",
+        "from_version": pick_field(fields, "from_version"),
+        "to_version": pick_field(fields, "to_version"),
+        "step": pick_field(fields, "step"),
+        "error": error,
+        "failed": is_failed_status(status, error),
+    }
+
+
+def iter_upgrade_attempts(document, source):
+    """Yield attempts of a document: the object itself, or the objects of its lists."""
+    if isinstance(document, list):
+        for item in document:
+            yield from iter_upgrade_attempts(item, source)
+        return
+    if not isinstance(document, dict):
+        return
+    attempt = upgrade_attempt(document, source)
+    if attempt:
+        yield attempt
+        return
+    for value in document.values():
+        if isinstance(value, list):
+            yield from iter_upgrade_attempts(value, source)
+
+
+class JsonStreamReader:
+    """Incremental JSON reader over a text stream.
+
+    The caller walks the outer containers token by token and decodes the
+    values inside them whole, so the buffer only holds the current value.
+    """
+
+    WHITESPACE = re.compile(r"\s*")
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.decoder = json.JSONDecoder()
+        self.buffer = ""
+        self.position = 0
+        self.eof = False
+
+    def _fill(self, size=JSON_CHUNK_SIZE):
+        # drops the consumed part, keeps the value being read
+        chunk = self.stream.read(size)
+        self.buffer, self.position = self.buffer[self.position:] + chunk, 0
+        self.eof = not chunk
+        return not self.eof
+
+    def peek(self):
+        """The next non-whitespace character, "" at the end of the stream."""
+        while True:
+            self.position = self.WHITESPACE.match(self.buffer, self.position).end()
+            if self.position < len(self.buffer):
+                return self.buffer[self.position]
+            if not self._fill():
+                return ""
+
+    def expect(self, characters):
+        character = self.peek()
+        if not character or character not in characters:
+            raise ValueError(f"expected one of {characters!r}, got {character or 'end of file'!r}")
+        self.position += 1
+        return character
+
+    def decode(self):
+        """Decode the next value whole."""
+        self.peek()
+        while True:
+            try:
+                value, end = self.decoder.raw_decode(self.buffer, self.position)
+            except json.JSONDecodeError:
+                # the value continues past the buffer, read at least as much again
+                if not self._fill(max(JSON_CHUNK_SIZE, len(self.buffer) - self.position)):
+                    raise
+                continue
+            # a number ending with the buffer may continue in the next chunk
+            if end == len(self.buffer) and not self.eof and self._fill():
+                continue
+            self.position = end
+            return value
+
+
+def iter_streamed_attempts(reader, source):
+    """iter_upgrade_attempts for the next value of reader, without decoding its lists whole.
+
+    Lists are read item by item, every item decoded on its own; an object
+    around them is read key by key. flatten_fields ignores list values, so the
+    object's own fields are complete without them.
+    """
+    character = reader.peek()
+    if character == "[":
+        reader.expect("[")
+        if reader.peek() == "]":
+            reader.expect("]")
+            return
+        while True:
+            yield from iter_upgrade_attempts(reader.decode(), source)
+            if reader.expect(",]") == "]":
+                return
+
+    if character != "{":
+        reader.decode()
+        return
+
+    reader.expect("{")
+    if reader.peek() == "}":
+        reader.expect("}")
+        return
+    document = {}
+    list_attempts = []
+    while True:
+        key = reader.decode()
+        reader.expect(":")
+        if reader.peek() == "[":
+            # attempts are small, unlike the list they come from
+            list_attempts.extend(iter_streamed_attempts(reader, source))
+        else:
+            document[key] = reader.decode()
+        if reader.expect(",}") == "}":
+            break
+    attempt = upgrade_attempt(document, source)
+    if attempt:
+        yield attempt
+    else:
+        yield from list_attempts
+
+
+def summarize_upgrade_file(full_path, source):
+    """Return (attempts, error) of one upgrade-analytics file. Runs in a worker process."""
+    try:
+        with open_log_stream(open(full_path, "rb"), full_path) as stream:
+            reader = JsonStreamReader(stream)
+            attempts = []
+            # one document, NDJSON or concatenated documents
+            while reader.peek():
+                attempts.extend(iter_streamed_attempts(reader, source))
+            return attempts, None
+    except READ_ERRORS + (ValueError,) as e:
+        return [], str(e)
+
+
+def iter_upgrade_files(root="."):
+    for path in iter_bundle_files(root):
+        if UPGRADE_ANALYTICS_DIR in Path(path).parts[:-1] and path.endswith((".json", ".json.gz")):
+            yield path
+
+
+def markdown_cell(value):
+    if value is None:
+        return ""
+    text = " ".join(str(value).split()).replace("|", "\\|")
+    return text if len(text) <= MAX_CELL_CHARS else text[: MAX_CELL_CHARS - 3] + "..."
+
+
+def short_time(timestamp):
+    return timestamp[:19].replace("T", " ") if timestamp else ""
+
+
+def duration(start, end):
+    if not start or not end:
+        return ""
+    seconds = (datetime.fromisoformat(end) - datetime.fromisoformat(start)).total_seconds()
+    return f"{int(seconds // 60)}m{int(seconds % 60):02d}s" if seconds >= 0 else ""
+
+
+def generate_upgrade_summary(attempts, failed_files):
+    """Markdown with the upgrade timeline and the failure table."""
+    failures = [a for a in attempts if a["failed"]]
+    lines = [
+        "## Upgrade attempts",
+        "",
+        f"{len(attempts)} attempts, {len(failures)} failed.",
+        "",
+        "| Start | End | Duration | From | To | Status | File |",
+        "|---|---|---|---|---|---|---|",
+    ]
+    for a in attempts:
+        cells = [short_time(a["start"]), short_time(a["end"]), duration(a["start"], a["end"]),
+                 a["from_version"], a["to_version"], a["status"], a["source"]]
+        lines.append("| " + " | ".join(markdown_cell(c) for c in cells) + " |")
+
+    if failures:
+        lines += ["", "### Failed upgrades", "", "| Start | Step | Error | File |", "|---|---|---|---|"]
+        for a in failures:
+            cells = [short_time(a["start"]), a["step"], a["error"], a["source"]]
+            lines.append("| " + " | ".join(markdown_cell(c) for c in cells) + " |")
+
+    if failed_files:
+        lines += ["", "### Unreadable upgrade-analytics files", ""]
+        lines += [f"- `{source}`: {markdown_cell(error)}" for source, error in failed_files]
+    return "\n".join(lines)
+
+
+def update_generated_section(file_path, name, content):
+    """Replace the content between the BEGIN/END markers of a section, appending the section if missing."""
+    begin = f"<!-- BEGIN {name} (generated by copilot_in_logs_bundle.py, do not edit) -->"
+    end = f"<!-- END {name} -->"
+    section = f"{begin}\n{content}\n{end}"
+    text = Path(file_path).read_text(encoding="utf-8") if Path(file_path).exists() else ""
+    start_index = text.find(begin)
+    end_index = text.find(end, start_index)
+    if start_index != -1 and end_index != -1:
+        text = text[:start_index] + section + text[end_index + len(end):]
+    else:
+        text = text.rstrip("\n") + "\n\n" + section + "\n"
+    write_text_atomic(file_path, text)
+
+
+def summarize_upgrades(root=".", workers=None, readme_file=README_FILE):
+    """Parse every upgrade-analytics JSON in parallel and write the summary section into README.md."""
+    paths = list(iter_upgrade_files(root))
+    attempts = []
+    failed_files = []
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        futures = {pool.submit(summarize_upgrade_file, os.path.join(root, p), p): p for p in paths}
+        for future in as_completed(futures):
+            file_attempts, error = future.result()
+            attempts.extend(file_attempts)
+            if error:
+                failed_files.append((futures[future], error))
+    attempts.sort(key=lambda a: (a["start"], a["source"]))
+    failed_files.sort()
+
+    update_generated_section(readme_file, "upgrade-analytics summary", generate_upgrade_summary(attempts, failed_files))
+    failures = sum(1 for a in attempts if a["failed"])
+    print(f"Summarized {len(attempts)} upgrade attempts ({failures} failed) from {len(paths)} files into {readme_file}")
+    return attempts
+
+
+def max_open_sources():
+    """How many logs may be merged at once, leaving file descriptors for everything else."""
+    soft_limit, _ = resource.getrlimit(resource.RLIMIT_NOFILE)
+    return max(16, soft_limit // 4)
+
+
+def iter_timeline_records(source, opener):
+    """Yield (timestamp, source, line) of one log in file order.
+
+    Lines without a timestamp, and lines stamped earlier than the line before,
+    get the previous timestamp so every file is a sorted input of the merge.
+    """
+    timestamp = None
+    try:
+        with opener() as stream:
+            if not is_text(stream):
+                return
+            for line in stream:
+                parsed = parse_timestamp(line)
+                if parsed and (timestamp is None or parsed > timestamp):
+                    timestamp = parsed
+                if timestamp is not None:
+                    yield timestamp, source, line.rstrip("\r\n")
+    except READ_ERRORS as e:
+        print(f"Timeline stops early for {source}: {e}")
+
+
+def iter_run_records(run_path):
+    with open(run_path, "r", encoding="utf-8", newline="\n") as f:
+        for line in f:
+            timestamp, source, text = line.rstrip("\n").split("\t", 2)
+            yield timestamp, source, text
+
+
+def write_timeline(records, timeline_file, index_file=None):
+    """Write merged records, and with index_file the byte offset where each minute starts."""
+    line_count = 0
+    offset = 0
+    minutes = []
+    tmp_path = f"{timeline_file}.tmp"
+    with open(tmp_path, "wb") as f:
+        for timestamp, source, text in records:
+            minute = timestamp[:16]
+            if index_file and (not minutes or minutes[-1][0] != minute):
+                minutes.append((minute, offset))
+            data = f"{timestamp}\t{source}\t{text}\n".encode("utf-8")
+            f.write(data)
+            offset += len(data)
+            line_count += 1
+    os.replace(tmp_path, timeline_file)
+    if index_file:
+        write_text_atomic(index_file, "".join(f"{minute}\t{start}\n" for minute, start in minutes))
+    return line_count
+
+
+def merge_records(streams):
+    return heapq.merge(*streams, key=itemgetter(0))
+
+
+def build_timeline(root=".", timeline_file=TIMELINE_FILE, index_file=TIMELINE_INDEX_FILE):
+    """Merge all logs of the bundle into one time-ordered file with a per-minute offset index."""
+    create_directory_if_not_exists(GITHUB_DIR)
+    streams = [iter_timeline_records(source, opener) for source, opener in iter_log_sources(root)]
+    source_count = len(streams)
+    batch_size = max_open_sources()
+    run_files = []
+    try:
+        while len(streams) > batch_size:
+            level_runs = []
+            for start in range(0, len(streams), batch_size):
+                run_file = f"{timeline_file}.run{len(run_files)}"
+                run_files.append(run_file)
+                write_timeline(merge_records(streams[start:start + batch_size]), run_file)
+                level_runs.append(run_file)
+            streams = [iter_run_records(run_file) for run_file in level_runs]
+        line_count = write_timeline(merge_records(streams), timeline_file, index_file)
+    finally:
+        for run_file in run_files:
+            if os.path.exists(run_file):
+                os.remove(run_file)
+    print(f"Merged {line_count} lines from {source_count} logs into {timeline_file}")
+    return line_count
+
+
+def query_timeline(start, end, timeline_file=TIMELINE_FILE, index_file=TIMELINE_INDEX_FILE, out=sys.stdout):
+    """Print timeline lines with start <= timestamp <= end, seeking to the first minute of the range."""
+    minutes = []
+    offsets = []
+    if not os.path.exists(index_file):
+        print(f"No timeline in {timeline_file}, build it with --timeline", file=sys.stderr)
+        return 0
+    with open(index_file, "r", encoding="utf-8") as f:
+        for line in f:
+            minute, offset = line.split("\t")
+            minutes.append(minute)
+            offsets.append(int(offset))
+
+    position = bisect.bisect_left(minutes, start[:16])
+    if position == len(minutes):
+        return 0
+    line_count = 0
+    with open(timeline_file, "rb") as f:
+        f.seek(offsets[position])
+        for raw_line in f:
+            timestamp = raw_line[:26].decode("ascii")
+            if timestamp > end:
+                break
+            if timestamp >= start:
+                out.write(raw_line.decode("utf-8"))
+                line_count += 1
+    return line_count
+
+
+def parse_query_time(text):
+    """argparse type: ISO date and time, seconds optional ("2024-05-01 10:30")."""
+    try:
+        return datetime.fromisoformat(text).replace(tzinfo=None)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"not a date and time: {text}")
+
+
+def timeline_key(moment):
+    return moment.strftime("%Y-%m-%dT%H:%M:%S.%f")
+
+
+class DrainClusterer:
+    """Online log template clustering after Drain (He et al., ICWS 2017).
+
+    The tree is keyed by token count, then by the first DRAIN_DEPTH tokens;
+    tokens with digits and tokens past DRAIN_MAX_CHILDREN siblings share the
+    WILDCARD branch. A leaf holds the clusters compared against a new line.
+    """
+
+    def __init__(self):
+        self.tree = {}
+        self.clusters = []
+        self.unclustered = 0
+
+    def _leaf(self, tokens):
+        node = self.tree.setdefault(len(tokens), {})
+        for token in tokens[:DRAIN_DEPTH]:
+            if any(c.isdigit() for c in token) or (token not in node and len(node) >= DRAIN_MAX_CHILDREN):
+                token = WILDCARD
+            node = node.setdefault(token, {})
+        return node.setdefault(None, [])
+
+    @staticmethod
+    def _similarity(template, tokens):
+        matches = sum(1 for t, u in zip(template, tokens) if t == u or t == WILDCARD)
+        return matches / len(tokens)
+
+    def _best_match(self, leaf, tokens):
+        best, best_similarity = None, DRAIN_SIMILARITY
+        for cluster in leaf:
+            similarity = self._similarity(cluster["template"], tokens)
+            if similarity >= best_similarity:
+                best, best_similarity = cluster, similarity
+        return best
+
+    def add(self, line, timestamp, source):
+        tokens = mask_line(line).split()[:DRAIN_MAX_TOKENS]
+        if not tokens:
+            return
+        leaf = self._leaf(tokens)
+        cluster = self._best_match(leaf, tokens)
+        if cluster is None:
+            if len(self.clusters) >= MAX_CLUSTERS:
+                self.unclustered += 1
+                return
+            cluster = {"template": tokens, "count": 0, "first_ts": None, "last_ts": None, "examples": []}
+            leaf.append(cluster)
+            self.clusters.append(cluster)
+        else:
+            cluster["template"] = [t if t == u else WILDCARD for t, u in zip(cluster["template"], tokens)]
+
+        cluster["count"] += 1
+        if timestamp:
+            if cluster["first_ts"] is None or timestamp < cluster["first_ts"]:
+                cluster["first_ts"] = timestamp
+            if cluster["last_ts"] is None or timestamp > cluster["last_ts"]:
+                cluster["last_ts"] = timestamp
+        if len(cluster["examples"]) < MAX_CLUSTER_EXAMPLES:
+            example = f"{source}: {line.strip()}"
+            if example not in cluster["examples"]:
+                cluster["examples"].append(example)
+
+    def ranked(self):
+        return sorted(self.clusters, key=lambda c: (-c["count"], c["first_ts"] or ""))
+
+
+def generate_cluster_summary(clusterer, line_count, limit=MAX_REPORTED_CLUSTERS):
+    clusters = clusterer.ranked()
+    lines = [
+        "## Error signatures",
+        "",
+        f"{line_count} error lines in {len(clusters)} signatures"
+        + (f", {clusterer.unclustered} lines over the {MAX_CLUSTERS} signature limit" if clusterer.unclustered else "")
+        + (f", top {limit} shown." if len(clusters) > limit else "."),
+        "",
+        "| # | Count | First seen | Last seen | Signature | Examples |",
+        "|---|---|---|---|---|---|",
+    ]
+    for rank, cluster in enumerate(clusters[:limit], 1):
+        examples = "<br>".join(markdown_cell(example) for example in cluster["examples"])
+        cells = [rank, cluster["count"], short_time(cluster["first_ts"]), short_time(cluster["last_ts"]),
+                 " ".join(cluster["template"])]
+        lines.append("| " + " | ".join(markdown_cell(c) for c in cells) + f" | {examples} |")
+    return "\n".join(lines)
+
+
+def cluster_errors(root=".", readme_file=README_FILE):
+    """Cluster every error line of the bundle in one pass and write the ranked signatures into README.md."""
+    clusterer = DrainClusterer()
+    line_count = 0
+    for source, opener in iter_log_sources(root):
+        try:
+            with opener() as stream:
+                if not is_text(stream):
+                    continue
+                for line in stream:
+                    if parse_severity(line) in ERROR_SEVERITIES:
+                        clusterer.add(line, parse_timestamp(line), source)
+                        line_count += 1
+        except READ_ERRORS as e:
+            print(f"Clustering stops early for {source}: {e}")
+
+    update_generated_section(readme_file, "error signatures", generate_cluster_summary(clusterer, line_count))
+    print(f"Clustered {line_count} error lines into {len(clusterer.clusters)} signatures in {readme_file}")
+    return clusterer
+
+
+def trigram_keys(data):
+    """Distinct case-folded trigrams of a byte string, as 24-bit integers."""
+    data = data.lower()
+    return {(a << 16) | (b << 8) | c for a, b, c in set(zip(data, data[1:], data[2:]))}
+
+
+def index_file_blocks(root, source):
+    """Cut one log into blocks at line boundaries and return (offset, length, first line, trigram keys) of each.
+
+    Runs in a worker process; the keys are returned as packed uint32 bytes.
+    """
+    blocks = []
+    try:
+        with open_source(root, source) as stream:
+            if not is_text(stream):
+                return blocks, None
+            offset = 0
+            line_number = 1
+            while data := stream.buffer.read(SEARCH_BLOCK_SIZE):
+                if not data.endswith(b"\n"):
+                    data += stream.buffer.readline()
+                keys = array("I", sorted(trigram_keys(data)))
+                blocks.append((offset, len(data), line_number, keys.tobytes()))
+                offset += len(data)
+                line_number += data.count(b"\n")
+    except READ_ERRORS as e:
+        return None, str(e)
+    return blocks, None
+
+
+class TrigramSegmentWriter:
+    """Collect postings in memory and write them as a segment every SEARCH_SEGMENT_MAX_POSTINGS."""
+
+    def __init__(self, index_dir, manifest):
+        self.index_dir = index_dir
+        self.manifest = manifest
+        self._reset()
+
+    def _reset(self):
+        self.postings = {}
+        self.docs = []
+        self.posting_count = 0
+
+    def add_block(self, file_id, offset, length, first_line, keys):
+        doc_id = len(self.docs)
+        self.docs.append((file_id, offset, length, first_line))
+        for key in keys:
+            doc_ids = self.postings.get(key)
+            if doc_ids is None:
+                doc_ids = self.postings[key] = array("I")
+            doc_ids.append(doc_id)
+        self.posting_count += len(keys)
+        if self.posting_count >= SEARCH_SEGMENT_MAX_POSTINGS:
+            self.flush()
+
+    def flush(self):
+        if not self.docs:
+            return
+        name = f"seg{self.manifest['next_segment']:05d}"
+        self.manifest["next_segment"] += 1
+        keys = array("I", sorted(self.postings))
+        offsets = array("Q", [0])
+        postings = array("I")
+        for key in keys:
+            postings.extend(self.postings[key])
+            offsets.append(len(postings))
+
+        segment_path = os.path.join(self.index_dir, name)
+        with open(f"{segment_path}.tri", "wb") as f:
+            f.write(SEARCH_SEGMENT_HEADER.pack(SEARCH_SEGMENT_MAGIC, len(keys)))
+            offsets.tofile(f)
+            keys.tofile(f)
+            postings.tofile(f)
+        with open(f"{segment_path}.docs", "wb") as f:
+            f.write(b"".join(SEARCH_DOC_RECORD.pack(*doc) for doc in self.docs))
+        self.manifest["segments"].append(name)
+        self._reset()
+
+
+class TrigramSegment:
+    """Memory-mapped, read-only view of one segment."""
+
+    def __init__(self, index_dir, name):
+        self._maps = []
+        self._views = []
+        segment_path = os.path.join(index_dir, name)
+        index = self._map(f"{segment_path}.tri")
+        magic, key_count = SEARCH_SEGMENT_HEADER.unpack_from(index)
+        if magic != SEARCH_SEGMENT_MAGIC:
+            raise ValueError(f"{segment_path}.tri is not a trigram segment")
+        start = SEARCH_SEGMENT_HEADER.size
+        self.offsets = self._view(index[start:start + 8 * (key_count + 1)].cast("Q"))
+        start += 8 * (key_count + 1)
+        self.keys = self._view(index[start:start + 4 * key_count].cast("I"))
+        self.postings = self._view(index[start + 4 * key_count:].cast("I"))
+        self.docs = self._map(f"{segment_path}.docs")
+
+    def _map(self, file_path):
+        with open(file_path, "rb") as f:
+            mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        self._maps.append(mapped)
+        return self._view(memoryview(mapped))
+
+    def _view(self, view):
+        self._views.append(view)
+        return view
+
+    def doc_count(self):
+        return len(self.docs) // SEARCH_DOC_RECORD.size
+
+    def doc(self, doc_id):
+        return SEARCH_DOC_RECORD.unpack_from(self.docs, doc_id * SEARCH_DOC_RECORD.size)
+
+    def postings_range(self, key):
+        position = bisect.bisect_left(self.keys, key)
+        if position == len(self.keys) or self.keys[position] != key:
+            return 0, 0
+        return self.offsets[position], self.offsets[position + 1]
+
+    def candidate_docs(self, keys):
+        """Blocks containing every key, all blocks when there are no keys."""
+        if not keys:
+            return range(self.doc_count())
+        ranges = sorted((self.postings_range(key) for key in keys), key=lambda r: r[1] - r[0])
+        doc_ids = set(self.postings[ranges[0][0]:ranges[0][1]])
+        for start, end in ranges[1:]:
+            if not doc_ids:
+                break
+            doc_ids.intersection_update(self.postings[start:end])
+        return sorted(doc_ids)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        for view in reversed(self._views):
+            view.release()
+        for mapped in self._maps:
+            mapped.close()
+
+
+def new_search_manifest():
+    return {"files": {}, "segments": [], "next_file_id": 0, "next_segment": 0, "dead_files": 0}
+
+
+def remove_unreferenced_segments(index_dir, manifest):
+    referenced = {SEARCH_MANIFEST_FILE}
+    for name in manifest["segments"]:
+        referenced.update((f"{name}.tri", f"{name}.docs"))
+    for name in os.listdir(index_dir):
+        if name not in referenced:
+            os.remove(os.path.join(index_dir, name))
+
+
+def build_search_index(root=".", workers=None, index_dir=SEARCH_INDEX_DIR):
+    """Add new and changed logs to the trigram index as a new segment."""
+    manifest_file = os.path.join(index_dir, SEARCH_MANIFEST_FILE)
+    manifest = load_json_file(manifest_file, new_search_manifest())
+    files = manifest["files"]
+    present = {source: source_stat(root, source) for source, _ in iter_log_sources(root)}
+
+    stale = [source for source, entry in files.items() if present.get(source) != {"size": entry["size"], "mtime": entry["mtime"]}]
+    for source in stale:
+        # postings of stale files stay in old segments, queries ignore their ids
+        del files[source]
+    manifest["dead_files"] += len(stale)
+    if manifest["dead_files"] > len(files):
+        # segment names keep counting, so the old manifest never points at a rewritten segment
+        manifest = {**new_search_manifest(), "next_segment": manifest["next_segment"]}
+        files = manifest["files"]
+
+    to_index = [source for source in present if source not in files]
+    create_directory_if_not_exists(index_dir)
+    writer = TrigramSegmentWriter(index_dir, manifest)
+    # a finished future holds all trigram keys of its file, so only a window of
+    # files is in flight and each future is dropped once its blocks are written
+    window = 2 * (workers or os.cpu_count() or 1)
+    sources = iter(to_index)
+    futures = {}
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        while True:
+            for source in islice(sources, window - len(futures)):
+                futures[pool.submit(index_file_blocks, root, source)] = source
+            if not futures:
+                break
+            done, _ = wait(futures, return_when=FIRST_COMPLETED)
+            for future in done:
+                source = futures.pop(future)
+                blocks, error = future.result()
+                if error:
+                    print(f"Skipping {source}: {error}")
+                    continue
+                file_id = manifest["next_file_id"]
+                manifest["next_file_id"] += 1
+                for offset, length, first_line, keys in blocks:
+                    writer.add_block(file_id, offset, length, first_line, array("I", keys))
+                files[source] = {**present[source], "id": file_id}
+    writer.flush()
+
+    write_text_atomic(manifest_file, json.dumps(manifest))
+    remove_unreferenced_segments(index_dir, manifest)
+    print(
+        f"Search index: {len(to_index)} files added, {len(files) - len(to_index)} unchanged, "
+        f"{len(manifest['segments'])} segments in {index_dir}"
+    )
+    return manifest
+
+
+def skip_bracket(pattern, position, opening, closing):
+    """Position after the bracket closing the one at position, escapes and nesting honored."""
+    depth = 0
+    while position < len(pattern):
+        c = pattern[position]
+        if c == "\\":
+            position += 2
+            continue
+        if c == opening:
+            depth += 1
+        elif c == closing:
+            depth -= 1
+            if depth == 0:
+                return position + 1
+        position += 1
+    return position
+
+
+def required_literals(pattern):
+    """Literal strings every match of a regex contains; conservative, empty when unsure (e.g. alternation)."""
+    if "|" in pattern:
+        return []
+    literals = []
+    current = []
+    position = 0
+    while position < len(pattern):
+        c = pattern[position]
+        if c == "\\" and position + 1 < len(pattern):
+            escaped = pattern[position + 1]
+            if escaped.isalnum():
+                # class escape (\d, \w...) or backreference
+                literals.append("".join(current))
+                current = []
+            else:
+                current.append(escaped)
+            position += 2
+            continue
+        if c in "*?{":
+            # the previous character is optional or repeated an unknown number of times
+            if current:
+                current.pop()
+            literals.append("".join(current))
+            current = []
+            position = skip_bracket(pattern, position, "{", "}") if c == "{" else position + 1
+            continue
+        if c in "+.^$":
+            literals.append("".join(current))
+            current = []
+            position += 1
+            continue
+        if c in "([":
+            # groups and classes are opaque
+            literals.append("".join(current))
+            current = []
+            position = skip_bracket(pattern, position, c, ")" if c == "(" else "]")
+            continue
+        current.append(c)
+        position += 1
+    literals.append("".join(current))
+    return [literal for literal in literals if len(literal) >= 3]
+
+
+def read_block_lines(stream, offset, length, first_line):
+    """Yield (line number, text) of one indexed block."""
+    stream.buffer.seek(offset)
+    data = stream.buffer.read(length)
+    lines = data.split(b"\n")
+    if data.endswith(b"\n"):
+        lines.pop()
+    for line_number, line in enumerate(lines, first_line):
+        yield line_number, line.decode("utf-8", errors="replace").rstrip("\r")
+
+
+def search_bundle(pattern, root=".", regex=False, ignore_case=False, max_hits=1000, index_dir=SEARCH_INDEX_DIR, out=sys.stdout):
+    """Print file:line hits of a literal or regex, scanning only blocks that contain all its trigrams."""
+    manifest_file = os.path.join(index_dir, SEARCH_MANIFEST_FILE)
+    if not Path(manifest_file).exists():
+        print(f"No search index in {index_dir}, build it with --search-index", file=sys.stderr)
+        return 0
+    manifest = load_json_file(manifest_file, None)
+    file_sources = {entry["id"]: source for source, entry in manifest["files"].items()}
+    keys = set()
+    for literal in required_literals(pattern) if regex else [pattern]:
+        keys |= trigram_keys(literal.encode("utf-8"))
+    matcher = re.compile(pattern if regex else re.escape(pattern), re.IGNORECASE if ignore_case else 0)
+
+    candidates = []
+    for name in manifest["segments"]:
+        with TrigramSegment(index_dir, name) as segment:
+            for doc_id in segment.candidate_docs(keys):
+                file_id, offset, length, first_line = segment.doc(doc_id)
+                if file_id in file_sources:
+                    candidates.append((file_sources[file_id], offset, length, first_line))
+    candidates.sort()
+
+    hits = 0
+    for source, blocks in groupby(candidates, key=itemgetter(0)):
+        if source_stat(root, source) != {k: manifest["files"][source][k] for k in ("size", "mtime")}:
+            print(f"{source} changed since it was indexed, rerun with --search-index", file=sys.stderr)
+        with open_source(root, source) as stream:
+            for _, offset, length, first_line in blocks:
+                for line_number, text in read_block_lines(stream, offset, length, first_line):
+                    if matcher.search(text):
+                        out.write(f"{source}:{line_number}: {text}\n")
+                        hits += 1
+                        if hits >= max_hits:
+                            print(f"Stopped after {max_hits} hits", file=sys.stderr)
+                            return hits
+    return hits
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Prepare a Zerto log bundle for Copilot analysis")
+    parser.add_argument(
+        "--extract",
+        action="store_true",
+        help="unpack nested zip/tar/tar.gz archives of the bundle, each into a directory named after it",
+    )
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=None,
+        help="number of worker processes for --extract, --upgrades and --search-index (default: number of CPUs)",
+    )
+    parser.add_argument(
+        "--index",
+        action="store_true",
+        help=f"stream every log once and write a per-file index to {LOG_INDEX_FILE}",
+    )
+    parser.add_argument(
+        "--upgrades",
+        action="store_true",
+        help=f"summarize {UPGRADE_ANALYTICS_DIR} JSON files into a timeline and failure table in {README_FILE}",
+    )
+    parser.add_argument(
+        "--cluster",
+        action="store_true",
+        help=f"group error lines into signatures and write the ranked table into {README_FILE}",
+    )
+    parser.add_argument(
+        "--search-index",
+        action="store_true",
+        help=f"add new and changed logs to the trigram search index in {SEARCH_INDEX_DIR}",
+    )
+    parser.add_argument("--search", metavar="PATTERN", help="print file:line hits of PATTERN using the search index")
+    parser.add_argument("--regex", action="store_true", help="treat the --search pattern as a regular expression")
+    parser.add_argument("--ignore-case", action="store_true", help="case-insensitive --search")
+    parser.add_argument("--max-hits", type=int, default=1000, help="stop --search after this many hits (default: 1000)")
+    parser.add_argument(
+        "--timeline",
+        action="store_true",
+        help=f"merge all logs by timestamp into {TIMELINE_FILE} with a per-minute offset index",
+    )
+    parser.add_argument(
+        "--window",
+        nargs=2,
+        type=parse_query_time,
+        metavar=("START", "END"),
+        help=f"print the lines of {TIMELINE_FILE} between two times",
+    )
+    parser.add_argument(
+        "--around",
+        type=parse_query_time,
+        metavar="TIME",
+        help=f"print the lines of {TIMELINE_FILE} within --window-minutes centered on TIME",
+    )
+    parser.add_argument("--window-minutes", type=float, default=30, help="width of the --around window (default: 30)")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    # a query alone only prints its results, they may be piped into other tools
+    query_only = (args.search or args.window or args.around) and not (
+        args.extract or args.index or args.upgrades or args.cluster or args.search_index or args.timeline
+    )
+    if not query_only:
+        setup_github_structure()
+    if args.extract:
+        extract_bundle(workers=args.workers)
+    if args.index:
+        build_log_index()
+    if args.upgrades:
+        summarize_upgrades(workers=args.workers)
+    if args.cluster:
+        cluster_errors()
+    if args.search_index:
+        build_search_index(workers=args.workers)
+    if args.search:
+        search_bundle(args.search, regex=args.regex, ignore_case=args.ignore_case, max_hits=args.max_hits)
+    if args.timeline:
+        build_timeline()
+    if args.around:
+        half_window = timedelta(minutes=args.window_minutes / 2)
+        args.window = (args.around - half_window, args.around + half_window)
+    if args.window:
+        start, end = args.window
+        query_timeline(timeline_key(start), timeline_key(end))
+    if not query_only:
+        print("GitHub Copilot setup completed successfully!")
+
+
 if __name__ == "__main__":
-    setup_github_structure()
-    print("GitHub Copilot setup completed successfully!")
+    try:
+        main()
+    except BrokenPipeError:
+        # the reader went away (e.g. "| head"), stdout must not be flushed again at exit
+        os.dup2(os.open(os.devnull, os.O_WRONLY), sys.stdout.fileno())
+        sys.exit(1)
 
 # python3 ./setup_copilot.py
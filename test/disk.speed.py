@@ -0,0 +1,380 @@
+"""
+Disk Speed Test Script
+
+This script measures disk throughput and latency on the paths Zerto writes to,
+so slow disk tickets get numbers instead of a single timed copy.
+
+Mechanism:
+1. For every --paths directory, each of --streams worker processes gets its own
+   --size test file, laid out once before the measurements start
+2. Runs every combination of --tests, --modes and --block-sizes:
+   - seq-write / seq-read:   blocks in file order
+   - rand-write / rand-read: blocks at random block-aligned offsets
+   - buffered mode goes through the page cache, reads start after the file
+     pages are dropped from the cache (POSIX_FADV_DONTNEED)
+   - direct mode opens the file with O_DIRECT from page-aligned buffers
+   - writes are fsync'ed at the end, and every --fsync-every blocks if set,
+     so the result is the disk and not the page cache
+   Each run stops after --size bytes or --runtime seconds per stream
+3. Every I/O call is timed with perf_counter_ns; a run reports MB/s and IOPS
+   over the wall time of all streams, and p50/p90/p99/p99.9/max latency over
+   the I/Os of all streams
+4. The fsync test writes one 4K block and times the fsync that follows,
+   --fsync-count times per stream, and reports only fsync latency
+   percentiles, no MB/s or IOPS
+5. All results are logged and saved as JSON to --output; test files are
+   removed at the end
+
+
+Oneliner
+curl -s https://raw.githubusercontent.com/mshlain/test/refs/heads/main/test/disk.speed.py | sudo python3
+
+"""
+
+import argparse
+import json
+import logging
+import mmap
+import multiprocessing
+import os
+import random
+import shutil
+import socket
+import time
+from array import array
+
+MB = 1024 * 1024
+SIZE_UNITS = {"K": 1024, "M": MB, "G": 1024 * MB}
+DIRECT_ALIGNMENT = 4096
+LAYOUT_CHUNK = 4 * MB
+FSYNC_BLOCK_SIZE = 4096
+IO_TESTS = ("seq-write", "seq-read", "rand-write", "rand-read")
+ALL_TESTS = IO_TESTS + ("fsync",)
+MODES = ("buffered", "direct")
+PERCENTILES = (50, 90, 99, 99.9)
+
+
+def setup_logging():
+    logging.basicConfig(
+        level=logging.INFO,
+        format="%(asctime)s - %(message)s",
+        handlers=[
+            logging.FileHandler("disk.speed.log"),
+            logging.StreamHandler(),  # Keep console output
+        ],
+    )
+
+
+def parse_size(text):
+    """Parse sizes like 4K, 512M, 2G or a plain number of bytes."""
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in SIZE_UNITS:
+        return int(float(text[:-1]) * SIZE_UNITS[text[-1]])
+    return int(text)
+
+
+def parse_list(choices):
+    """argparse type for comma-separated values out of choices."""
+
+    def parse(text):
+        values = [value.strip() for value in text.split(",") if value.strip()]
+        unknown = [value for value in values if value not in choices]
+        if unknown:
+            raise argparse.ArgumentTypeError(f"unknown {', '.join(unknown)}, choose from {', '.join(choices)}")
+        return values
+
+    return parse
+
+
+def latency_summary(latencies_ns):
+    """Exact percentiles (nearest rank) of latency samples, in milliseconds."""
+    if not latencies_ns:
+        return {}
+    ordered = sorted(latencies_ns)
+    summary = {}
+    for percent in PERCENTILES:
+        rank = max(1, -(-len(ordered) * percent // 100))
+        summary[f"p{percent:g}_ms"] = ordered[int(rank) - 1] / 1e6
+    summary["max_ms"] = ordered[-1] / 1e6
+    return summary
+
+
+def stream_file(path, stream):
+    return os.path.join(path, f"disk.speed.{os.getpid()}.{stream}.dat")
+
+
+def aligned_buffer(size):
+    """Page-aligned buffer filled with random bytes, usable with O_DIRECT."""
+    buffer = mmap.mmap(-1, size)
+    buffer.write(os.urandom(size))
+    return buffer
+
+
+def lay_out_file(file_path, size):
+    """Write the test file once, so reads and overwrites hit allocated blocks."""
+    if os.path.exists(file_path) and os.path.getsize(file_path) >= size:
+        return
+    chunk = os.urandom(LAYOUT_CHUNK)
+    with open(file_path, "wb") as f:
+        for offset in range(0, size, LAYOUT_CHUNK):
+            f.write(chunk[: min(LAYOUT_CHUNK, size - offset)])
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def drop_file_cache(file_path):
+    fd = os.open(file_path, os.O_RDONLY)
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_DONTNEED)
+    finally:
+        os.close(fd)
+
+
+def block_offsets(test, size, block_size):
+    count = size // block_size
+    if test.startswith("seq"):
+        return (index * block_size for index in range(count))
+    return (random.randrange(count) * block_size for _ in range(count))
+
+
+def run_stream(file_path, test, mode, block_size, size, runtime, fsync_every):
+    """One stream of one run; returns bytes, start/end (monotonic ns) and packed per-I/O latencies."""
+    writing = test.endswith("write")
+    flags = os.O_WRONLY if writing else os.O_RDONLY
+    if mode == "direct":
+        flags |= os.O_DIRECT
+    if not writing and mode == "buffered":
+        drop_file_cache(file_path)
+
+    buffer = aligned_buffer(block_size)
+    latencies = array("Q")
+    done = 0
+    deadline = time.monotonic_ns() + int(runtime * 1e9)
+    try:
+        fd = os.open(file_path, flags)
+    except OSError as e:
+        return {"error": f"open {file_path} ({mode}): {e}"}
+
+    started = time.monotonic_ns()
+    try:
+        for offset in block_offsets(test, size, block_size):
+            start = time.perf_counter_ns()
+            if writing:
+                os.pwrite(fd, buffer, offset)
+            else:
+                os.preadv(fd, [buffer], offset)
+            latencies.append(time.perf_counter_ns() - start)
+            done += block_size
+            if writing and fsync_every and len(latencies) % fsync_every == 0:
+                os.fsync(fd)
+            if time.monotonic_ns() >= deadline:
+                break
+        if writing:
+            os.fsync(fd)
+    except OSError as e:
+        return {"error": f"{test} {file_path} ({mode}, {block_size}B): {e}"}
+    finally:
+        os.close(fd)
+        buffer.close()
+    return {"bytes": done, "started": started, "ended": time.monotonic_ns(), "latencies": latencies.tobytes()}
+
+
+def run_fsync_stream(file_path, count, runtime):
+    """Write one block and time the fsync after it, count times."""
+    buffer = os.urandom(FSYNC_BLOCK_SIZE)
+    latencies = array("Q")
+    deadline = time.monotonic_ns() + int(runtime * 1e9)
+    try:
+        fd = os.open(file_path, os.O_WRONLY)
+    except OSError as e:
+        return {"error": f"open {file_path}: {e}"}
+
+    started = time.monotonic_ns()
+    try:
+        for index in range(count):
+            os.pwrite(fd, buffer, (index % 256) * FSYNC_BLOCK_SIZE)
+            start = time.perf_counter_ns()
+            os.fsync(fd)
+            latencies.append(time.perf_counter_ns() - start)
+            if time.monotonic_ns() >= deadline:
+                break
+    except OSError as e:
+        return {"error": f"fsync {file_path}: {e}"}
+    finally:
+        os.close(fd)
+    return {"bytes": len(latencies) * FSYNC_BLOCK_SIZE, "started": started, "ended": time.monotonic_ns(),
+            "latencies": latencies.tobytes()}
+
+
+def combine_streams(result, stream_results):
+    """Aggregate stream results: throughput over the wall time of all streams, latency over all I/Os."""
+    errors = [r["error"] for r in stream_results if "error" in r]
+    if errors:
+        result["error"] = errors[0]
+        return result
+
+    latencies = array("Q")
+    for stream_result in stream_results:
+        latencies.frombytes(stream_result["latencies"])
+    if not latencies:
+        # nothing to measure, e.g. a block size larger than the file
+        result["error"] = "no I/O completed"
+        return result
+    if result["test"] == "fsync":
+        # the 4K writes between the fsyncs make MB/s and IOPS meaningless here
+        result.update({"fsyncs": len(latencies), "latency": latency_summary(latencies)})
+        return result
+
+    seconds = (max(r["ended"] for r in stream_results) - min(r["started"] for r in stream_results)) / 1e9
+    total_bytes = sum(r["bytes"] for r in stream_results)
+    result.update(
+        {
+            "bytes": total_bytes,
+            "ios": len(latencies),
+            "seconds": round(seconds, 3),
+            "mb_per_s": round(total_bytes / MB / seconds, 2) if seconds else None,
+            "iops": round(len(latencies) / seconds, 1) if seconds else None,
+            "latency": latency_summary(latencies),
+        }
+    )
+    return result
+
+
+def log_result(result):
+    label = f"{result['path']} {result['test']}"
+    if result["test"] != "fsync":
+        label += f" {result['mode']} bs={result['block_size']}"
+    label += f" streams={result['streams']}"
+    if "error" in result:
+        logging.info(f"{label}: {result['error']}")
+        return
+    latency = result["latency"]
+    if result["test"] == "fsync":
+        volume = f"{result['fsyncs']} fsyncs"
+    else:
+        volume = f"{result['mb_per_s']} MB/s, {result['iops']} IOPS"
+    logging.info(
+        f"{label}: {volume}, "
+        f"p50: {latency['p50_ms']:.3f}ms, p99: {latency['p99_ms']:.3f}ms, "
+        f"p99.9: {latency['p99.9_ms']:.3f}ms, max: {latency['max_ms']:.3f}ms"
+    )
+
+
+def benchmark_path(args, pool, path):
+    results = []
+    created = not os.path.isdir(path)
+    os.makedirs(path, exist_ok=True)
+    files = [stream_file(path, stream) for stream in range(args.streams)]
+    needed = args.size * args.streams
+    free = shutil.disk_usage(path).free
+    try:
+        if free < needed:
+            logging.info(f"{path}: needs {needed // MB}MB, only {free // MB}MB free, skipped")
+            return [{"path": path, "error": f"not enough free space ({free // MB}MB < {needed // MB}MB)"}]
+
+        logging.info(f"{path}: laying out {args.streams} x {args.size // MB}MB test files")
+        pool.starmap(lay_out_file, [(file_path, args.size) for file_path in files])
+
+        for test in (t for t in args.tests if t in IO_TESTS):
+            for mode in args.modes:
+                for block_size in args.block_sizes:
+                    result = {"path": path, "test": test, "mode": mode, "block_size": block_size, "streams": args.streams}
+                    if mode == "direct" and block_size % DIRECT_ALIGNMENT:
+                        result["error"] = f"O_DIRECT needs a multiple of {DIRECT_ALIGNMENT} bytes block size"
+                    else:
+                        stream_results = pool.starmap(
+                            run_stream,
+                            [(f, test, mode, block_size, args.size, args.runtime, args.fsync_every) for f in files],
+                        )
+                        combine_streams(result, stream_results)
+                    log_result(result)
+                    results.append(result)
+
+        if "fsync" in args.tests:
+            result = {"path": path, "test": "fsync", "block_size": FSYNC_BLOCK_SIZE, "streams": args.streams}
+            stream_results = pool.starmap(run_fsync_stream, [(f, args.fsync_count, args.runtime) for f in files])
+            combine_streams(result, stream_results)
+            log_result(result)
+            results.append(result)
+    finally:
+        for file_path in files:
+            if os.path.exists(file_path):
+                os.remove(file_path)
+        if created:
+            os.rmdir(path)
+    return results
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Disk throughput and latency benchmark")
+    parser.add_argument(
+        "--paths",
+        nargs="+",
+        default=["/opt/zerto/fio", "/var/log/zerto/fio"],
+        help="directories to test, created if missing",
+    )
+    parser.add_argument(
+        "--tests",
+        type=parse_list(ALL_TESTS),
+        default=list(ALL_TESTS),
+        help=f"comma-separated tests out of {','.join(ALL_TESTS)} (default: all)",
+    )
+    parser.add_argument(
+        "--modes",
+        type=parse_list(MODES),
+        default=list(MODES),
+        help="comma-separated I/O modes: buffered (page cache), direct (O_DIRECT)",
+    )
+    parser.add_argument(
+        "--block-sizes",
+        type=lambda text: [parse_size(size) for size in text.split(",")],
+        default=[4096, MB],
+        help="comma-separated block sizes (default: 4K,1M)",
+    )
+    parser.add_argument("--size", type=parse_size, default=1024 * MB, help="test file size per stream (default: 1G)")
+    parser.add_argument("--streams", type=int, default=1, help="parallel streams (processes), each on its own file")
+    parser.add_argument("--runtime", type=float, default=30, help="maximum seconds per run and stream")
+    parser.add_argument("--fsync-every", type=int, default=0, help="also fsync every N written blocks, 0 only at the end")
+    parser.add_argument("--fsync-count", type=int, default=1000, help="fsyncs per stream in the fsync test")
+    parser.add_argument("--output", default="disk.speed.results.json", help="where the JSON results are saved")
+    args = parser.parse_args()
+    if min(args.block_sizes) <= 0:
+        parser.error("--block-sizes must be positive")
+    if args.size < max(args.block_sizes):
+        parser.error(f"--size must be at least the largest block size ({max(args.block_sizes)} bytes)")
+    if args.fsync_count < 1:
+        parser.error("--fsync-count must be at least 1")
+    return args
+
+
+def main():
+    args = parse_args()
+    setup_logging()
+    print(__doc__.strip())
+    print("-" * 80)  # Add a separator line
+    logging.info("")
+    logging.info(
+        f"Starting disk speed test, paths: {' '.join(args.paths)}, tests: {','.join(args.tests)}, "
+        f"modes: {','.join(args.modes)}, streams: {args.streams}, size: {args.size // MB}MB"
+    )
+
+    report = {
+        "host": socket.gethostname(),
+        "started": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "config": {key: value for key, value in vars(args).items() if key != "output"},
+        "results": [],
+    }
+    try:
+        # fork, not the spawn/forkserver default of newer Pythons: the piped
+        # one-liner has no __main__ file the workers could re-import
+        with multiprocessing.get_context("fork").Pool(args.streams) as pool:
+            for path in args.paths:
+                report["results"].extend(benchmark_path(args, pool, path))
+    finally:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        logging.info(f"Results saved to {args.output}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,10 +1,38 @@
 #!/usr/bin/env python3
 # curl https://raw.githubusercontent.com/mshlain/test/refs/heads/main/test/fips.py | python3
+import argparse
+import hashlib
+import importlib.util
+import json
 import os
 import logging
+import shlex
+import shutil
+import socket
 import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+KUBECTL = "/snap/bin/microk8s.kubectl"
+CMD_TIMEOUT_SECONDS = 60
+EVIDENCE_MAX_CHARS = 500
+CACHE_FILE = "/var/tmp/fips.cache.json"
+HOST = socket.gethostname()
 
 errors_array = []
+results_count = 0
+cmd_timings = []
+cmd_timings_lock = threading.Lock()
+# set by --json, every check result is written there as one NDJSON line
+json_stream = None
+json_stream_lock = threading.Lock()
+# fleet mode only: host -> {"checks": n, "errors": n}
+host_results = {}
+# set by --cache-ttl, see ProbeCache
+probe_cache = None
 
 
 class ColorFormatter(logging.Formatter):
@@ -15,9 +43,6 @@ class ColorFormatter(logging.Formatter):
     reset = "\x1b[0m"
 
     def format(self, record):
-        if record.levelno == logging.ERROR:
-            errors_array.append(record.msg)
-
         if record.levelno == logging.INFO:
             record.msg = f"{self.blue}{record.msg}{self.reset}"
         elif record.levelno == logging.ERROR:
@@ -32,6 +57,7 @@ def setup_logging():
     logging.addLevelName(logging.SUCCESS, "SUCCESS")
     logger = logging.getLogger("fips")
     logger.success = lambda msg, *args: logger._log(logging.SUCCESS, msg, args)
+    logger.result = lambda record: _log_result(logger, record)
 
     handler = logging.StreamHandler()
     handler.setFormatter(ColorFormatter("%(message)s"))
@@ -40,16 +66,237 @@ def setup_logging():
     return logger
 
 
-def run_cmd(cmd):
+class BufferedLog:
+    """Collects log calls of one unit of work so they can be replayed in order."""
+
+    def __init__(self):
+        self.records = []
+
+    def log(self, level, msg):
+        self.records.append((level, msg))
+
+    def info(self, msg):
+        self.log(logging.INFO, msg)
+
+    def success(self, msg):
+        self.log(logging.SUCCESS, msg)
+
+    def error(self, msg):
+        self.log(logging.ERROR, msg)
+
+    def result(self, record):
+        self.records.append((None, record))
+
+    def flush_to(self, log):
+        for level, msg in self.records:
+            if level is None:
+                log.result(msg)
+            else:
+                log.log(level, msg)
+        self.records = []
+
+
+def _trim(text, limit=EVIDENCE_MAX_CHARS):
+    text = text.strip()
+    if len(text) <= limit:
+        return text
+    return text[: limit - 3] + "..."
+
+
+def emit_json(record):
+    if json_stream is None:
+        return
+    with json_stream_lock:
+        json_stream.write(json.dumps(record) + "\n")
+        json_stream.flush()
+
+
+def report_result(log, check, target, status, message, evidence="", started=None, cached=False):
+    """Report one check result: streamed as JSON right away, logged in order.
+
+    status is one of "pass", "fail" or "skip".
+    """
+    duration = time.perf_counter() - started if started is not None else 0.0
+    record = {
+        "type": "check",
+        "check": check,
+        "target": target,
+        "status": status,
+        "message": message,
+        "duration": round(duration, 3),
+        "evidence": _trim(evidence),
+    }
+    if cached:
+        record["cached"] = True
+    emit_json(record)
+    log.result(record)
+    return status != "fail"
+
+
+def _log_result(log, record):
+    # called on the main thread only (directly or from BufferedLog.flush_to),
+    # so errors_array keeps the report order
+    global results_count
+    results_count += 1
+    if record["status"] == "fail":
+        errors_array.append(record["message"])
+        log.error(record["message"])
+    elif record["status"] == "pass":
+        log.success(record["message"])
+    else:
+        log.info(record["message"])
+
+
+def run_in_order(log, tasks, workers):
+    # every task gets its own BufferedLog, output is replayed in submission
+    # order on the calling thread, so errors_array is filled deterministically
+    if workers <= 1:
+        for task in tasks:
+            task(log)
+        return
+
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        futures = []
+        for task in tasks:
+            buffered_log = BufferedLog()
+            futures.append((buffered_log, executor.submit(task, buffered_log)))
+
+        for buffered_log, future in futures:
+            try:
+                future.result()
+            finally:
+                buffered_log.flush_to(log)
+
+
+def _record_timing(cmd, started):
+    with cmd_timings_lock:
+        cmd_timings.append((cmd, time.perf_counter() - started))
+
+
+def run_argv(argv, timeout=CMD_TIMEOUT_SECONDS):
+    """Run argv directly (no shell) and return the CompletedProcess."""
+    started = time.perf_counter()
+    try:
+        return subprocess.run(argv, capture_output=True, text=True, timeout=timeout)
+    finally:
+        _record_timing(shlex.join(argv), started)
+
+
+def run_cmd(argv, timeout=CMD_TIMEOUT_SECONDS):
+    return probe_cmd(argv, timeout)[0]
+
+
+def probe_cmd(argv, timeout=CMD_TIMEOUT_SECONDS):
+    """Return (output, ok) of argv; ok is False on a non-zero exit, timeout or spawn error."""
     try:
-        result = subprocess.run(cmd, capture_output=True, text=True, shell=True)
+        result = run_argv(argv, timeout=timeout)
         stderr = result.stderr.strip()
         if stderr and result.returncode != 0:
-            return stderr
+            return stderr, False
         stdout = result.stdout.strip()
-        return stderr + "\n" + stdout
+        return stderr + "\n" + stdout, result.returncode == 0
+    except subprocess.TimeoutExpired:
+        return f"Error: '{shlex.join(argv)}' timed out after {timeout}s", False
     except Exception as e:
+        return f"Error: {e}", False
+
+
+def read_file(path):
+    # plain files are read in-process instead of spawning cat
+    started = time.perf_counter()
+    try:
+        with open(path, "r") as f:
+            return f.read().strip()
+    except OSError as e:
         return f"Error: {e}"
+    finally:
+        _record_timing(f"read {path}", started)
+
+
+def probe_file(path):
+    """Return (content, ok) of path, ok is False when it could not be read."""
+    content = read_file(path)
+    return content, not content.startswith("Error:")
+
+
+class ProbeCache:
+    """On-disk cache of probe outputs, entries expire after ttl seconds.
+
+    Keys are "host:<hostname>:<check>" for host probes and
+    "image:<digests>:<check>" for pod probes, so replicas and re-created
+    pods of an unchanged image hit the same entry.
+    """
+
+    def __init__(self, path, ttl):
+        self.path = path
+        self.ttl = ttl
+        self.lock = threading.Lock()
+        self.entries = self._load()
+        self.dirty = False
+
+    def _load(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {}
+
+    def get(self, key):
+        with self.lock:
+            entry = self.entries.get(key)
+        if entry and time.time() - entry["time"] < self.ttl:
+            return entry["value"]
+        return None
+
+    def put(self, key, check, value):
+        with self.lock:
+            self.entries[key] = {"check": check, "time": time.time(), "value": value}
+            self.dirty = True
+
+    def invalidate(self, checks=None):
+        """Drop the entries of the given checks, or every entry."""
+        with self.lock:
+            for key, entry in list(self.entries.items()):
+                if not checks or entry["check"] in checks:
+                    del self.entries[key]
+                    self.dirty = True
+
+    def save(self):
+        with self.lock:
+            if not self.dirty:
+                return
+            directory = os.path.dirname(self.path) or "."
+            os.makedirs(directory, exist_ok=True)
+            with tempfile.NamedTemporaryFile("w", dir=directory, delete=False) as f:
+                json.dump(self.entries, f)
+            os.replace(f.name, self.path)
+            self.dirty = False
+
+
+def cached_probe(key, check, probe):
+    """Return (output, cached) of probe, served from probe_cache when fresh.
+
+    probe returns (output, ok); only outputs of successful runs are cached.
+    """
+    if probe_cache is None or key is None:
+        return probe()[0], False
+
+    key = f"{key}:{check}"
+    value = probe_cache.get(key)
+    if value is not None:
+        return value, True
+
+    value, ok = probe()
+    # failures (non-zero exit, timeout, unreadable file) are retried on the next run
+    if ok:
+        probe_cache.put(key, check, value)
+    return value, False
+
+
+def _image_cache_key(images):
+    if not images:
+        return None
+    return "image:" + ",".join(images)
 
 
 def log_section(log, title):
@@ -60,66 +307,85 @@ def log_section(log, title):
 
 
 def check_fips_in_kernel(log):
+    started = time.perf_counter()
     log_section(log, "Test fips in kernel")
-    cmd = "cat /proc/sys/crypto/fips_enabled"
-    log.info(f"Command: {cmd}")
+    path = "/proc/sys/crypto/fips_enabled"
+    log.info(f"Command: read {path}")
     log.info("Expected: 1")
 
-    result = run_cmd(cmd)
-    result = result.strip()
-    log.info(f"Result:  {result}")
+    result, cached = cached_probe(f"host:{HOST}", "fips_in_kernel", lambda: probe_file(path))
+    log.info(f"Result:  {result}" + (" (cached)" if cached else ""))
 
     if result == "1":
-        log.success("FIPS is enabled in kernel")
+        report_result(log, "fips_in_kernel", HOST, "pass", "FIPS is enabled in kernel", result, started, cached)
     else:
-        log.error("FIPS is not enabled in kernel")
-
-
-def check_openssl(log):
-    log_section(log, "Print openssl location")
-    result = run_cmd("which openssl")
-    log.info(f"Result: {result}")
-
-    log_section(log, "Print openssl version")
-    result = run_cmd("openssl version -a")
-    log.info(f"Result:\n{result}")
-
-    log_section(log, "Print openssl directory")
-    result = run_cmd("ls -lah /usr/lib/ssl")
-    log.info(f"Result:\n{result}")
-
-    log_section(log, "Print openssl providers directory")
-    result = run_cmd("ls -lah /usr/lib/ssl/providers")
-    log.info(f"Result:\n{result}")
-
-    log_section(log, "Print fipsmodule.cnf file")
-    result = run_cmd("cat /usr/lib/ssl/providers/fipsmodule.cnf")
-    log.info(f"Result:\n{result}")
+        report_result(log, "fips_in_kernel", HOST, "fail", "FIPS is not enabled in kernel", result, started, cached)
+
+
+def _openssl_step(title, probe, separator="\n"):
+    def step(log):
+        log_section(log, title)
+        result = probe()
+        log.info(f"Result:{separator}{result}")
+
+    return step
+
+
+def check_openssl(log, workers=1):
+    steps = [
+        _openssl_step(
+            "Print openssl location",
+            lambda: shutil.which("openssl") or "openssl not found in PATH",
+            separator=" ",
+        ),
+        _openssl_step(
+            "Print openssl version",
+            lambda: run_cmd(["openssl", "version", "-a"]),
+        ),
+        _openssl_step(
+            "Print openssl directory",
+            lambda: run_cmd(["ls", "-lah", "/usr/lib/ssl"]),
+        ),
+        _openssl_step(
+            "Print openssl providers directory",
+            lambda: run_cmd(["ls", "-lah", "/usr/lib/ssl/providers"]),
+        ),
+        _openssl_step(
+            "Print fipsmodule.cnf file",
+            lambda: read_file("/usr/lib/ssl/providers/fipsmodule.cnf"),
+        ),
+    ]
+    run_in_order(log, steps, workers)
 
 
 def check_providers(log):
+    started = time.perf_counter()
     log_section(log, "Test openssl providers")
-    cmd = "openssl list -providers"
-    result = run_cmd(cmd)
-    log.info(f"Result: {result}")
+    cmd = ["openssl", "list", "-providers"]
+    result, cached = cached_probe(f"host:{HOST}", "openssl_providers", lambda: probe_cmd(cmd))
+    log.info(f"Result: {result}" + (" (cached)" if cached else ""))
 
     if all(x in result for x in ["fips", "OpenSSL FIPS Provider", "status: active"]):
-        log.success("FIPS provider is enabled successfully")
+        message = "FIPS provider is enabled successfully"
+        report_result(log, "openssl_providers", HOST, "pass", message, result, started, cached)
     else:
-        log.error("FIPS provider is not enabled properly")
+        message = "FIPS provider is not enabled properly"
+        report_result(log, "openssl_providers", HOST, "fail", message, result, started, cached)
 
 
 def check_ciphers(log):
+    started = time.perf_counter()
     log_section(log, "Test openssl ciphers")
-    cmd = "openssl ciphers -v"
-    log.info(f"Command: {cmd}")
+    cmd = ["openssl", "ciphers", "-v"]
+    log.info(f"Command: {shlex.join(cmd)}")
     result = run_cmd(cmd)
     log.info(f"Result:\n{result}")
 
     if "SSLv3" in result:
-        log.error("SSLv3 is not FIPS compliant")
+        sslv3_ciphers = "\n".join(line for line in result.split("\n") if "SSLv3" in line)
+        report_result(log, "openssl_ciphers", HOST, "fail", "SSLv3 is not FIPS compliant", sslv3_ciphers, started)
     else:
-        log.success("No SSLv3 ciphers found, FIPS compliance is maintained")
+        report_result(log, "openssl_ciphers", HOST, "pass", "No SSLv3 ciphers found, FIPS compliance is maintained", "", started)
 
 
 def load_env_file(file_path):
@@ -145,84 +411,168 @@ def load_env_file(file_path):
     return env_dict
 
 def check_microk8s_args(log):
+    started = time.perf_counter()
     log_section(log, "Test microk8s args")
 
-    cmd = "cat /var/snap/microk8s/current/args/fips-env"
-    log.info(f"Command: {cmd}")
-    result = run_cmd(cmd)
+    path = "/var/snap/microk8s/current/args/fips-env"
+    log.info(f"Command: read {path}")
+    result = read_file(path)
     log.info(f"Result: {result}")
 
-    fips_env_values = load_env_file("/var/snap/microk8s/current/args/fips-env")
+    fips_env_values = load_env_file(path)
     go_fips_value = fips_env_values.get("GOFIPS", "-1")
 
     if go_fips_value == "1":
-        log.success("GOFIPS is enabled in microk8s")
+        report_result(log, "microk8s_gofips", HOST, "pass", "GOFIPS is enabled in microk8s", result, started)
     else:
-        log.error(f"GOFIPS is not enabled in microk8s. Expected value: 1. Current value: {go_fips_value}")
+        message = f"GOFIPS is not enabled in microk8s. Expected value: 1. Current value: {go_fips_value}"
+        report_result(log, "microk8s_gofips", HOST, "fail", message, result, started)
+
+
+def _load_host_commands():
+    """Import host_commands.py from next to this script, None when it is not there."""
+    script_path = globals().get("__file__")
+    # piped into python3 __file__ is "<stdin>", the cwd is no place to import from
+    if not script_path or not os.path.isfile(script_path):
+        return None
+    module_path = os.path.join(os.path.dirname(os.path.abspath(script_path)), "host_commands.py")
+    if not os.path.isfile(module_path):
+        return None
+    spec = importlib.util.spec_from_file_location("host_commands", module_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+def bootloader_fips_enabled(output):
+    """True when the kernel command line of a GRUB configuration (or a bare
+    command line) ends up with fips=1; comments and other variables are ignored."""
+    fips = None
+    for line in output.splitlines():
+        try:
+            tokens = shlex.split(line, comments=True)
+        except ValueError:
+            continue
+        # a single NAME=value word is a variable, GRUB_CMDLINE_LINUX* hold the arguments
+        if len(tokens) == 1 and tokens[0].partition("=")[0].isidentifier():
+            name, _, value = tokens[0].partition("=")
+            if not name.startswith("GRUB_CMDLINE_LINUX"):
+                continue
+            tokens = value.split()
+        for token in tokens:
+            # the kernel takes the last fips= argument
+            if token.startswith("fips="):
+                fips = token
+    return fips == "fips=1"
+
+
+def check_bootloader_fips(log):
+    started = time.perf_counter()
+    log_section(log, "Test bootloader fips configuration")
+
+    # optional: only with host_commands.py downloaded next to fips.py
+    host_commands = _load_host_commands()
+    if host_commands is None:
+        message = "host_commands.py not found next to fips.py, bootloader check skipped"
+        report_result(log, "bootloader_fips", HOST, "skip", message, "", started)
+        return
+    if not os.path.exists(host_commands.SOCKET_PATH):
+        message = f"{host_commands.SOCKET_PATH} not found, bootloader check skipped"
+        report_result(log, "bootloader_fips", HOST, "skip", message, "", started)
+        return
+
+    command = host_commands.BOOTLOADER_FIPS_COMMAND
+    log.info(f"Command: {command} over {host_commands.SOCKET_PATH}")
+    try:
+        result = host_commands.run_commands([command])[0]
+    except (OSError, host_commands.HostCommandError) as e:
+        result = {"status": "error", "seconds": 0.0, "info": None, "error": str(e)}
+    finally:
+        _record_timing(f"host command {command}", started)
+    output = host_commands.task_output(result["info"])
+    evidence = output or result.get("error", "") or json.dumps(result["info"])
+    log.info(f"Result: {result['status']} after {result['seconds']}s\n{evidence}")
+
+    if result["status"] == "completed" and bootloader_fips_enabled(output):
+        message = "FIPS is enabled in the bootloader configuration"
+        report_result(log, "bootloader_fips", HOST, "pass", message, evidence, started)
+    else:
+        message = f"FIPS is not enabled in the bootloader configuration (task {result['status']})"
+        report_result(log, "bootloader_fips", HOST, "fail", message, evidence, started)
 
 
-def _build_exec_on_pod_cmd(namespace, pod_name_prefix, cmd):
-    # kubectl -n default exec -it $(kubectl -n default get pods | grep "^zkeycloak-db" | head -n 1 | awk '{print $1}') -- openssl list -providers
-    return f"/snap/bin/microk8s.kubectl -n {namespace} exec $(/snap/bin/microk8s.kubectl -n {namespace} get pods | grep \"^{pod_name_prefix}\" | head -n 1 | awk '{{print $1}}') -- {cmd}"
+def _build_exec_on_pod_cmd(namespace, pod_name, cmd):
+    # kubectl -n default exec zkeycloak-db-0 -- openssl list -providers
+    return [KUBECTL, "-n", namespace, "exec", pod_name, "--"] + cmd
 
 
-def check_infra_pod(log, namespace, pod_name):
+def check_infra_pod(log, namespace, pod_name, images=()):
+    started = time.perf_counter()
     log_section(log, f"Test {pod_name} pod")
 
-    pod_cmd = "openssl list -providers"
+    pod_cmd = ["openssl", "list", "-providers"]
     cmd = _build_exec_on_pod_cmd(namespace, pod_name, pod_cmd)
-    log.info(f"Command: {cmd}")
-    result = run_cmd(cmd)
-    log.info(f"Result:\n{result}")
+    log.info(f"Command: {shlex.join(cmd)}")
+    result, cached = cached_probe(_image_cache_key(images), "pod_openssl_providers", lambda: probe_cmd(cmd))
+    log.info(f"Result:\n{result}" + ("\n(cached)" if cached else ""))
 
+    target = f"{namespace}/{pod_name}"
     if all(x in result for x in ["fips", "OpenSSL FIPS Provider", "status: active"]):
-        log.success(f"FIPS provider is enabled successfully in {pod_name} pod")
-    else:
-        log.error(f"FIPS provider is not enabled properly in {pod_name} pod")
+        message = f"FIPS provider is enabled successfully in {pod_name} pod"
+        return report_result(log, "pod_openssl_providers", target, "pass", message, result, started, cached)
+
+    message = f"FIPS provider is not enabled properly in {pod_name} pod"
+    return report_result(log, "pod_openssl_providers", target, "fail", message, result, started, cached)
 
 
-def check_chainguard_pod(log, namespace, pod_name):
+def check_chainguard_pod(log, namespace, pod_name, images=()):
+    started = time.perf_counter()
     log_section(log, f"Test {pod_name} pod")
 
-    pod_cmd = "openssl-fips-test"
+    pod_cmd = ["openssl-fips-test"]
     cmd = _build_exec_on_pod_cmd(namespace, pod_name, pod_cmd)
-    log.info(f"Command: {cmd}")
-    result = run_cmd(cmd)
-    log.info(f"Result:\n{result}")
+    log.info(f"Command: {shlex.join(cmd)}")
+    result, cached = cached_probe(_image_cache_key(images), "pod_openssl_fips_test", lambda: probe_cmd(cmd))
+    log.info(f"Result:\n{result}" + ("\n(cached)" if cached else ""))
 
+    target = f"{namespace}/{pod_name}"
     if "Lifecycle assurance satisfied" in result:
-        log.success(
-            f"FIPS provider is enabled successfully in {pod_name} pod (chainguard)"
-        )
-    else:
-        log.error(
-            f"FIPS provider is not enabled properly in {pod_name} pod (chainguard)"
-        )
+        message = f"FIPS provider is enabled successfully in {pod_name} pod (chainguard)"
+        return report_result(log, "pod_openssl_fips_test", target, "pass", message, result, started, cached)
 
+    message = f"FIPS provider is not enabled properly in {pod_name} pod (chainguard)"
+    return report_result(log, "pod_openssl_fips_test", target, "fail", message, result, started, cached)
 
-def _core(log):
-    check_fips_in_kernel(log)
-    log.info("\n")
-    check_openssl(log)
-    log.info("\n")
-    check_providers(log)
-    log.info("\n")
-    check_ciphers(log)
-    log.info("\n")
-    check_microk8s_args(log)
-    log.info("\n")
 
+def _host_task(check, **kwargs):
+    def task(log):
+        check(log, **kwargs)
+        log.info("\n")
 
-def check_single_pod(log, namespace, short_pod_name):
+    return task
+
+
+def _core(log, workers=1):
+    # host checks are independent, the phase takes as long as the slowest one
+    tasks = [
+        _host_task(check_fips_in_kernel),
+        _host_task(check_openssl, workers=workers),
+        _host_task(check_providers),
+        _host_task(check_ciphers),
+        _host_task(check_microk8s_args),
+        _host_task(check_bootloader_fips),
+    ]
+    run_in_order(log, tasks, workers)
+
+
+def _pod_kind(short_pod_name):
     not_compliant_pods = ["db-management-utility", "scripts-service"]
     if short_pod_name in not_compliant_pods:
-        log.error(f"{short_pod_name} is not fips compliant")
-        return
+        return "not_compliant"
 
     not_testable_pods = ["host-metrics", "pods-metrics-kube-eagle"]
     if short_pod_name in not_testable_pods:
-        log.info(f"{short_pod_name} is not testable")
-        return
+        return "not_testable"
 
     chainguard_pods = [
         "coredns",
@@ -232,44 +582,307 @@ def check_single_pod(log, namespace, short_pod_name):
         "metrics-server-metrics-server-fips",
     ]
     if short_pod_name in chainguard_pods:
-        check_chainguard_pod(log, namespace, short_pod_name)
-        return
+        return "chainguard"
 
     # all the rest pods are infra pods
-    check_infra_pod(
+    return "infra"
+
+
+def check_single_pod(log, pod):
+    namespace = pod["namespace"]
+    short_pod_name = pod["short_name"]
+    kind = _pod_kind(short_pod_name)
+
+    target = f"{namespace}/{pod['name']}"
+    if kind == "not_compliant":
+        return report_result(log, "pod_known_status", target, "fail", f"{short_pod_name} is not fips compliant")
+
+    if kind == "not_testable":
+        return report_result(log, "pod_known_status", target, "skip", f"{short_pod_name} is not testable")
+
+    if kind == "chainguard":
+        return check_chainguard_pod(log, namespace, pod["name"], pod["images"])
+
+    return check_infra_pod(
         log,
         namespace,
-        short_pod_name,
+        pod["name"],
+        pod["images"],
     )
 
 
-def check_all_pods(log):
-    cmd = "/snap/bin/microk8s.kubectl get pods --all-namespaces"
-    result = run_cmd(cmd)
-    lines = result.split("\n")
-    for line in lines:
-        if not line:
-            continue
-        if "READY" in line:
-            continue
-        parts = line.split()
-        namespace = parts[0]
-        pod_name = parts[1]
-        # short pod name is pod name without two last parts
-        parts = pod_name.split("-")
-        if len(parts) < 3:
-            short_pod_name = pod_name
+def check_pod_group(log, pods):
+    """Check the first pod of the group and report its result for all of them."""
+    representative = pods[0]
+    passed = check_single_pod(log, representative)
+
+    if _pod_kind(representative["short_name"]) == "chainguard":
+        check, suffix = "pod_openssl_fips_test", " (chainguard)"
+    else:
+        check, suffix = "pod_openssl_providers", ""
+    evidence = f"same image as {representative['namespace']}/{representative['name']}, not executed again"
+    for pod in pods[1:]:
+        log_section(log, f"Test {pod['name']} pod")
+        log.info(f"Result: {evidence}")
+        target = f"{pod['namespace']}/{pod['name']}"
+        if passed:
+            message = f"FIPS provider is enabled successfully in {pod['name']} pod{suffix}"
+            report_result(log, check, target, "pass", message, evidence)
+        else:
+            message = f"FIPS provider is not enabled properly in {pod['name']} pod{suffix}"
+            report_result(log, check, target, "fail", message, evidence)
+    return passed
+
+
+def group_pods_by_image(pods):
+    # pods running the same container images get the same answer from
+    # openssl, so only executable checks with known image digests are grouped
+    groups = {}
+    for pod in pods:
+        kind = _pod_kind(pod["short_name"])
+        if kind in ("chainguard", "infra") and pod["images"]:
+            key = (kind, pod["images"])
         else:
-            short_pod_name_parts = parts[:-2]
-            short_pod_name = "-".join(short_pod_name_parts)
+            key = (kind, pod["namespace"], pod["name"])
+        groups.setdefault(key, []).append(pod)
+    return list(groups.values())
+
+
+def _short_pod_name(pod_name):
+    # short pod name is pod name without two last parts
+    parts = pod_name.split("-")
+    if len(parts) < 3:
+        short_pod_name = pod_name
+    else:
+        short_pod_name_parts = parts[:-2]
+        short_pod_name = "-".join(short_pod_name_parts)
+
+    if not short_pod_name:
+        raise ValueError("short_pod_name is empty")
+    return short_pod_name
+
+
+def _pod_images(pod_json):
+    # imageID carries the digest, image is only the (mutable) tag: a pod with
+    # any container lacking an imageID gets no images, so it is neither
+    # grouped nor cached and always checked on its own
+    statuses = pod_json.get("status", {}).get("containerStatuses", [])
+    images = [status.get("imageID") for status in statuses]
+    if not images or not all(images):
+        return ()
+    return tuple(sorted(images))
+
+
+def build_pod_index(pods_json):
+    """Map short pod names to the pods behind them, in listing order."""
+    index = {}
+    for item in pods_json.get("items", []):
+        metadata = item.get("metadata", {})
+        pod_name = metadata["name"]
+        short_pod_name = _short_pod_name(pod_name)
+        index.setdefault(short_pod_name, []).append(
+            {
+                "namespace": metadata.get("namespace", "default"),
+                "name": pod_name,
+                "short_name": short_pod_name,
+                "images": _pod_images(item),
+            }
+        )
+    return index
 
-        if not short_pod_name:
-            raise ValueError("short_pod_name is empty")
 
-        check_single_pod(log, namespace, short_pod_name)
+def load_pod_index():
+    cmd = [KUBECTL, "get", "pods", "--all-namespaces", "-o", "json"]
+    result = run_argv(cmd)
+    if result.returncode != 0:
+        raise RuntimeError(f"Command '{shlex.join(cmd)}' failed: {result.stderr.strip()}")
+    return build_pod_index(json.loads(result.stdout))
+
+
+def _pod_group_task(pods):
+    return lambda log: check_pod_group(log, pods)
+
+
+def check_all_pods(log, workers=1, dedup_images=False):
+    started = time.perf_counter()
+    try:
+        pod_index = load_pod_index()
+    except Exception as e:
+        report_result(log, "list_pods", HOST, "fail", f"Failed to list pods: {e}", started=started)
+        return
+
+    all_pods = [pod for pods in pod_index.values() for pod in pods]
+    if dedup_images:
+        groups = group_pods_by_image(all_pods)
+    else:
+        groups = [[pod] for pod in all_pods]
+
+    tasks = []
+    for pods in groups:
+        tasks.append(_pod_group_task(pods))
+
+    run_in_order(log, tasks, workers)
+
+
+def parse_inventory(path):
+    """Return the hosts of an inventory file, one [user@]host[:port] per line."""
+    hosts = []
+    with open(path, "r") as f:
+        for line in f:
+            line = line.split("#")[0].strip()
+            if line:
+                hosts.append(line)
+    return hosts
+
+
+def _ssh_argv(args, host, control_dir, *options):
+    # all ssh calls of a host share one master connection through ControlPath
+    target, _, port = host.partition(":")
+    control_path = os.path.join(control_dir, hashlib.sha1(host.encode()).hexdigest()[:16])
+    argv = shlex.split(args.ssh_command)
+    argv += ["-o", f"ControlPath={control_path}", "-o", "BatchMode=yes"]
+    argv += ["-o", f"ConnectTimeout={args.ssh_timeout}", "-o", "ServerAliveInterval=15"]
+    if port:
+        argv += ["-p", port]
+    return argv + list(options) + [target]
+
+
+def _forward_result(log, host, record):
+    record = dict(record, host=host, message=f"{host}: {record['message']}")
+    stats = host_results[host]
+    stats["checks"] += 1
+    if record["status"] == "fail":
+        stats["errors"] += 1
+    emit_json(record)
+    log.result(record)
+
+
+def _remote_command(args):
+    remote_argv = shlex.split(args.remote_python) + ["-", "--json", "--workers", str(args.workers)]
+    if args.dedup_images:
+        remote_argv.append("--dedup-images")
+    if args.cache_ttl:
+        remote_argv += ["--cache-ttl", str(args.cache_ttl)]
+    if args.invalidate_cache is not None:
+        remote_argv += ["--invalidate-cache"] + args.invalidate_cache
+    return shlex.join(remote_argv)
+
+
+def _start_ssh_master(argv, timeout):
+    """Start a persisting ControlMaster and return (returncode, stderr).
+
+    The backgrounded master keeps its stdout/stderr open (OpenSSH < 8.4),
+    so they must not be pipes: waiting for pipe EOF would last until the
+    timeout even on a working host.
+    """
+    started = time.perf_counter()
+    with tempfile.TemporaryFile(mode="w+") as stderr:
+        try:
+            returncode = subprocess.run(
+                argv, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL, stderr=stderr, timeout=timeout
+            ).returncode
+        except subprocess.TimeoutExpired:
+            returncode = -1
+            stderr.write("timed out opening the connection\n")
+        finally:
+            _record_timing(shlex.join(argv), started)
+        stderr.seek(0)
+        return returncode, stderr.read()
+
+
+def check_remote_host(log, host, script_source, args, control_dir):
+    """Run this script on host over ssh and forward its NDJSON results."""
+    started = time.perf_counter()
+    host_results[host] = {"checks": 0, "errors": 0}
+    log_section(log, f"Host {host}")
+
+    master_argv = _ssh_argv(
+        args, host, control_dir, "-o", "ControlMaster=yes", "-o", "ControlPersist=300", "-N", "-f"
+    )
+    returncode, master_stderr = _start_ssh_master(master_argv, timeout=args.ssh_timeout * 2)
+    if returncode != 0:
+        host_results[host]["errors"] += 1
+        message = f"{host}: ssh connection failed"
+        report_result(log, "fleet_connect", host, "fail", message, master_stderr, started)
+        return
+
+    try:
+        argv = _ssh_argv(args, host, control_dir, "-o", "ControlMaster=no") + [_remote_command(args)]
+        with tempfile.TemporaryFile(mode="w+") as stderr:
+            proc = subprocess.Popen(
+                argv, stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=stderr, text=True
+            )
+            # a hung host must not hold its worker, ssh is killed on expiry
+            expired = threading.Event()
+            timer = threading.Timer(args.remote_timeout, lambda: (expired.set(), proc.kill()))
+            timer.start()
+            summary = None
+            try:
+                proc.stdin.write(script_source)
+                proc.stdin.close()
+
+                for line in proc.stdout:
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        continue
+                    if record.get("type") == "summary":
+                        summary = record
+                    else:
+                        _forward_result(log, host, record)
+                proc.wait()
+            except BrokenPipeError:
+                proc.wait()
+            finally:
+                timer.cancel()
+                _record_timing(f"fleet {host}", started)
+
+            if summary is None or expired.is_set():
+                stderr.seek(0)
+                host_results[host]["errors"] += 1
+                if expired.is_set():
+                    message = f"{host}: remote run timed out after {args.remote_timeout}s"
+                else:
+                    message = f"{host}: remote run did not complete, exit code {proc.returncode}"
+                report_result(log, "fleet_run", host, "fail", message, stderr.read(), started)
+    finally:
+        try:
+            run_argv(_ssh_argv(args, host, control_dir, "-O", "exit"), timeout=args.ssh_timeout)
+        except Exception:
+            pass
+
+
+def _remote_host_task(host, script_source, args, control_dir):
+    return lambda log: check_remote_host(log, host, script_source, args, control_dir)
+
+
+def check_fleet(log, args):
+    script_path = globals().get("__file__")
+    if not script_path or not os.path.isfile(script_path):
+        raise SystemExit("--fleet needs fips.py on disk, download it instead of piping it to python3")
+    with open(script_path, "r") as f:
+        script_source = f.read()
+
+    hosts = parse_inventory(args.fleet)
+    with tempfile.TemporaryDirectory(prefix="fips-ssh-") as control_dir:
+        tasks = [_remote_host_task(host, script_source, args, control_dir) for host in hosts]
+        run_in_order(log, tasks, args.fleet_workers)
 
 
 def print_summary():
+    if json_stream is not None:
+        summary = {
+            "type": "summary",
+            "target": HOST,
+            "checks": results_count,
+            "errors": len(errors_array),
+            "messages": errors_array,
+        }
+        if host_results:
+            summary["hosts"] = host_results
+        emit_json(summary)
+        return
+
     print("\n")
     print("\n")
     print("\n")
@@ -281,11 +894,119 @@ def print_summary():
     else:
         print("Summary: No errors found.")
 
+    if host_results:
+        failed_hosts = [host for host, stats in host_results.items() if stats["errors"]]
+        print(f"Hosts: {len(host_results)} checked, {len(failed_hosts)} with errors")
+        for host, stats in host_results.items():
+            print(f"  {host}: {stats['checks']} checks, {stats['errors']} errors")
+
+    print_timings()
+
+
+def print_timings(slowest_count=5):
+    if not cmd_timings:
+        return
+    total = sum(seconds for _, seconds in cmd_timings)
+    print(f"Commands: {len(cmd_timings)}, total time {total:.2f}s, slowest:")
+    for cmd, seconds in sorted(cmd_timings, key=lambda x: x[1], reverse=True)[:slowest_count]:
+        print(f"  {seconds:7.2f}s  {cmd}")
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="FIPS compliance checks")
+    parser.add_argument(
+        "--workers",
+        type=int,
+        default=8,
+        help="number of checks run concurrently, 1 runs them one by one",
+    )
+    parser.add_argument(
+        "--dedup-images",
+        action="store_true",
+        help="exec into one pod per set of identical container images and "
+        "report its result for every pod of the set",
+    )
+    parser.add_argument(
+        "--json",
+        action="store_true",
+        help="stream one NDJSON record per check to stdout, logs stay on stderr",
+    )
+    parser.add_argument(
+        "--fleet",
+        metavar="INVENTORY",
+        help="run the checks over ssh on every host of the inventory file "
+        "([user@]host[:port] per line) instead of locally",
+    )
+    parser.add_argument(
+        "--fleet-workers",
+        type=int,
+        default=16,
+        help="number of hosts checked concurrently in fleet mode",
+    )
+    parser.add_argument(
+        "--ssh-command",
+        default="ssh",
+        help="ssh client used in fleet mode, may include extra options",
+    )
+    parser.add_argument(
+        "--ssh-timeout",
+        type=int,
+        default=15,
+        help="ssh connect timeout in seconds in fleet mode",
+    )
+    parser.add_argument(
+        "--remote-timeout",
+        type=int,
+        default=600,
+        help="seconds a fleet host may take for the whole remote run before it is reported as failed",
+    )
+    parser.add_argument(
+        "--remote-python",
+        default="python3",
+        help="interpreter command on fleet hosts, e.g. 'sudo python3'",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=int,
+        default=0,
+        help="reuse kernel, host providers and per-image pod probe results "
+        "younger than this many seconds, 0 disables the cache",
+    )
+    parser.add_argument(
+        "--cache-file",
+        default=CACHE_FILE,
+        help="location of the probe cache",
+    )
+    parser.add_argument(
+        "--invalidate-cache",
+        nargs="*",
+        metavar="CHECK",
+        help="drop cached results of the given checks (all checks if none given) before running",
+    )
+    return parser.parse_args()
+
 
 def main():
+    global json_stream, probe_cache
+    args = parse_args()
+    if args.json:
+        json_stream = sys.stdout
     log = setup_logging()
-    _core(log)
-    check_all_pods(log)
+    if args.fleet:
+        check_fleet(log, args)
+        print_summary()
+        return
+
+    if args.invalidate_cache is not None:
+        cache = ProbeCache(args.cache_file, args.cache_ttl)
+        cache.invalidate(args.invalidate_cache)
+        cache.save()
+    if args.cache_ttl > 0:
+        probe_cache = ProbeCache(args.cache_file, args.cache_ttl)
+    _core(log, workers=args.workers)
+    check_all_pods(log, workers=args.workers, dedup_images=args.dedup_images)
+    if probe_cache is not None:
+        probe_cache.save()
     print_summary()
 
 
@@ -0,0 +1,383 @@
+"""
+Host Commands Client
+
+Runs commands through the host-commands service on its unix socket and waits
+for their completion, instead of starting a task and sleeping a fixed time
+before asking for its result (see trigger_host_command.bash).
+
+Mechanism:
+1. Opens one HTTP/1.1 connection to the unix socket and keeps it for the run
+2. Sends TasksService/StartTask for every command in one pipelined batch
+3. Polls TasksService/GetTaskInfo for all running tasks, again in one batch,
+   starting after 50ms and doubling the interval up to 1s, until each task
+   reports a final state or its TimeoutSecs (plus a grace period) has passed
+4. Prints one JSON line per task: command, id, status
+   (completed, failed, timeout, error), seconds and the last task info
+5. --serve-stub runs a local stand-in of the service on the socket path, whose
+   tasks complete after --stub-delay seconds, to try the client without a host
+
+Other scripts import run_commands() from this file, e.g. fips.py for the
+bootloader FIPS check when host_commands.py sits next to it.
+
+
+Usage
+sudo python3 host_commands.py GetBootloaderFipsConfiguration
+python3 host_commands.py --serve-stub --socket /tmp/host_commands.sock &
+python3 host_commands.py --socket /tmp/host_commands.sock GetBootloaderFipsConfiguration
+
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import re
+import sys
+import time
+import uuid
+
+SOCKET_PATH = "/opt/zerto/host_commands/sockets/socket"
+START_TASK_PATH = "/TasksService/StartTask"
+GET_TASK_INFO_PATH = "/TasksService/GetTaskInfo"
+BOOTLOADER_FIPS_COMMAND = "GetBootloaderFipsConfiguration"
+DEFAULT_TIMEOUT_SECS = 9
+# the service needs a moment after TimeoutSecs to report the timeout itself
+TIMEOUT_GRACE_SECS = 2
+# a request sent at the deadline still gets this long for its answer
+RESPONSE_TIMEOUT_SECS = 1.0
+FIRST_POLL_INTERVAL = 0.05
+MAX_POLL_INTERVAL = 1.0
+STATUS_KEYS = ("status", "state", "taskstatus", "taskstate")
+DONE_KEYS = ("iscompleted", "completed", "isdone", "done", "isfinished", "finished")
+OUTPUT_KEYS = ("output", "result", "stdout")
+RUNNING_STATES = {"new", "created", "pending", "queued", "waiting", "started", "running", "inprogress", "executing"}
+FAILED_STATES = {"failed", "failure", "error", "faulted", "timedout", "timeout", "cancelled", "canceled", "aborted"}
+COMPLETED_STATES = {"completed", "complete", "succeeded", "success", "successful", "done", "finished"}
+STUB_OUTPUTS = {BOOTLOADER_FIPS_COMMAND: 'GRUB_CMDLINE_LINUX_DEFAULT="quiet splash fips=1"'}
+
+
+class HostCommandError(Exception):
+    pass
+
+
+def _field(info, names):
+    """Value of the first key of info matching names, compared lowercased without "_"."""
+    normalized = {str(key).replace("_", "").lower(): value for key, value in info.items()}
+    for name in names:
+        if name in normalized:
+            return normalized[name]
+    return None
+
+
+def _known_state(status):
+    """"failed", "completed", "running" or None for a status value.
+
+    Enum-style names are matched by their trailing words, so
+    "TASK_STATUS_TIMED_OUT" and "TaskStatusRunning" are understood.
+    """
+    words = [word.lower() for word in re.findall(r"[A-Z]?[a-z]+|[A-Z]+(?![a-z])|\d+", str(status))]
+    for start in range(len(words)):
+        name = "".join(words[start:])
+        if name in FAILED_STATES:
+            return "failed"
+        if name in COMPLETED_STATES:
+            return "completed"
+        if name in RUNNING_STATES:
+            return "running"
+    return None
+
+
+def task_state(info):
+    """Return "running", "completed" or "failed" for a GetTaskInfo response.
+
+    Only a known final state or an explicit done flag ends a task; anything
+    else (numeric codes, unknown names, no state at all) keeps it running
+    until the deadline turns it into a timeout.
+    """
+    done = _field(info, DONE_KEYS)
+    state = _known_state(_field(info, STATUS_KEYS) or "")
+    if state == "failed":
+        return "failed"
+    if state == "completed" or done is True:
+        return "completed"
+    return "running"
+
+
+def task_output(info):
+    """The command output of a GetTaskInfo response, "" when it has none."""
+    output = _field(info or {}, OUTPUT_KEYS)
+    return "" if output is None else str(output)
+
+
+class HostCommandsClient:
+    """One persistent HTTP/1.1 connection to the host-commands unix socket.
+
+    post_many() pipelines a batch of requests: all are written at once and
+    the responses are read back in order.
+    """
+
+    def __init__(self, socket_path=SOCKET_PATH):
+        self.socket_path = socket_path
+        self.reader = None
+        self.writer = None
+        self.lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.close()
+
+    async def close(self):
+        if self.writer is None:
+            return
+        writer, self.reader, self.writer = self.writer, None, None
+        writer.close()
+        try:
+            await writer.wait_closed()
+        except OSError:
+            pass
+
+    @staticmethod
+    def _encode_request(path, payload):
+        body = json.dumps(payload).encode()
+        head = (
+            f"POST {path} HTTP/1.1\r\n"
+            "Host: localhost\r\n"
+            "Content-Type: application/json\r\n"
+            f"Content-Length: {len(body)}\r\n"
+            "\r\n"
+        )
+        return head.encode() + body
+
+    async def _read_chunked_body(self):
+        chunks = []
+        while True:
+            size = int((await self.reader.readline()).split(b";")[0], 16)
+            if size == 0:
+                # trailers end with an empty line
+                while (await self.reader.readline()).strip():
+                    pass
+                return b"".join(chunks)
+            chunks.append(await self.reader.readexactly(size))
+            await self.reader.readline()
+
+    async def _read_response(self):
+        status_line = await self.reader.readline()
+        if not status_line:
+            raise ConnectionError("host-commands service closed the connection")
+        status = int(status_line.split()[1])
+        headers = {}
+        while True:
+            line = await self.reader.readline()
+            if not line.strip():
+                break
+            name, _, value = line.decode("latin-1").partition(":")
+            headers[name.strip().lower()] = value.strip().lower()
+
+        if headers.get("transfer-encoding") == "chunked":
+            body = await self._read_chunked_body()
+        else:
+            body = await self.reader.readexactly(int(headers.get("content-length", 0)))
+        return status, body, headers.get("connection") == "close"
+
+    async def post_many(self, requests):
+        """POST (path, payload) requests pipelined and return their JSON responses in order.
+
+        A response that is not HTTP 200 with a JSON body comes back as a
+        HostCommandError in its place; connection errors are raised.
+        """
+        async with self.lock:
+            if self.writer is None:
+                self.reader, self.writer = await asyncio.open_unix_connection(self.socket_path)
+            try:
+                self.writer.write(b"".join(self._encode_request(path, payload) for path, payload in requests))
+                await self.writer.drain()
+                responses = []
+                for _ in requests:
+                    status, body, closing = await self._read_response()
+                    responses.append(self._decode(status, body))
+                    if closing and len(responses) < len(requests):
+                        raise ConnectionError("host-commands service closed the connection mid-batch")
+                if closing:
+                    await self.close()
+                return responses
+            except (OSError, asyncio.IncompleteReadError, ValueError, IndexError, asyncio.CancelledError):
+                # the connection state is unknown (also when cancelled by a
+                # timeout mid-response), the next call reconnects
+                await self.close()
+                raise
+
+    @staticmethod
+    def _decode(status, body):
+        text = body.decode("utf-8", errors="replace")
+        if status != 200:
+            return HostCommandError(f"HTTP {status}: {text[:200]}")
+        try:
+            return json.loads(text)
+        except ValueError:
+            return HostCommandError(f"not JSON: {text[:200]}")
+
+
+async def _post_before(client, requests, deadline):
+    """post_many bounded by deadline; a timeout or malformed response raises HostCommandError."""
+    try:
+        timeout = max(0.0, deadline - time.monotonic()) + RESPONSE_TIMEOUT_SECS
+        return await asyncio.wait_for(client.post_many(requests), timeout)
+    except asyncio.TimeoutError:
+        raise HostCommandError("no response from the host-commands service in time") from None
+    except (asyncio.IncompleteReadError, ValueError, IndexError) as e:
+        raise HostCommandError(f"malformed response from the host-commands service: {e!r}") from e
+
+
+async def run_tasks(commands, socket_path=SOCKET_PATH, timeout_secs=DEFAULT_TIMEOUT_SECS):
+    """Start all commands in one batch and poll until each completes or times out.
+
+    Raises OSError when the service cannot be reached at all.
+    """
+    started = time.monotonic()
+    deadline = started + timeout_secs + TIMEOUT_GRACE_SECS
+    results = [{"command": command, "id": None, "status": "error", "seconds": 0.0, "info": None} for command in commands]
+    async with HostCommandsClient(socket_path) as client:
+        start_requests = [(START_TASK_PATH, {"CommandName": c, "TimeoutSecs": str(timeout_secs)}) for c in commands]
+        try:
+            responses = await _post_before(client, start_requests, deadline)
+        except HostCommandError as e:
+            responses = [HostCommandError(f"StartTask failed: {e}")] * len(commands)
+        for result, response in zip(results, responses):
+            task_id = None if isinstance(response, Exception) else _field(response, ("id", "taskid"))
+            if task_id is None:
+                result["error"] = str(response)
+                result["seconds"] = round(time.monotonic() - started, 3)
+                continue
+            result.update(id=task_id, status="running")
+
+        interval = FIRST_POLL_INTERVAL
+        while running := [r for r in results if r["status"] == "running"]:
+            # the last poll lands on the deadline, not up to one interval after it
+            await asyncio.sleep(max(0.0, min(interval, deadline - time.monotonic())))
+            interval = min(interval * 2, MAX_POLL_INTERVAL)
+            try:
+                infos = await _post_before(client, [(GET_TASK_INFO_PATH, {"Id": r["id"]}) for r in running], deadline)
+            except (OSError, HostCommandError) as e:
+                # retried on the next poll over a new connection, past the deadline it is a timeout
+                infos = [HostCommandError(f"GetTaskInfo failed: {e}")] * len(running)
+
+            now = time.monotonic()
+            for result, info in zip(running, infos):
+                result["seconds"] = round(now - started, 3)
+                if isinstance(info, HostCommandError):
+                    result["error"] = str(info)
+                else:
+                    result.pop("error", None)
+                    result["info"] = info
+                    result["status"] = task_state(info)
+                if result["status"] == "running" and now >= deadline:
+                    result["status"] = "timeout"
+    return results
+
+
+def run_commands(commands, socket_path=SOCKET_PATH, timeout_secs=DEFAULT_TIMEOUT_SECS):
+    """Blocking wrapper around run_tasks for callers without an event loop."""
+    return asyncio.run(run_tasks(commands, socket_path, timeout_secs))
+
+
+class StubHostCommandsService:
+    """Local stand-in of the host-commands service; tasks complete after delay seconds."""
+
+    def __init__(self, delay):
+        self.delay = delay
+        self.tasks = {}
+
+    def dispatch(self, path, payload):
+        if path == START_TASK_PATH:
+            task_id = str(uuid.uuid4())
+            self.tasks[task_id] = (payload.get("CommandName"), time.monotonic() + self.delay)
+            return 200, {"Id": task_id}
+        if path == GET_TASK_INFO_PATH:
+            task = self.tasks.get(payload.get("Id"))
+            if task is None:
+                return 404, {"Error": "unknown task id"}
+            command, ready_at = task
+            info = {"Id": payload["Id"], "CommandName": command, "Status": "Running"}
+            if time.monotonic() >= ready_at:
+                info.update(Status="Completed", Output=STUB_OUTPUTS.get(command, ""))
+            return 200, info
+        return 404, {"Error": f"unknown path {path}"}
+
+    async def handle(self, reader, writer):
+        try:
+            # keep-alive: serve requests until the client closes
+            while request_line := await reader.readline():
+                path = request_line.split()[1].decode()
+                length = 0
+                while (line := await reader.readline()).strip():
+                    name, _, value = line.decode("latin-1").partition(":")
+                    if name.strip().lower() == "content-length":
+                        length = int(value)
+                body = await reader.readexactly(length)
+                status, payload = self.dispatch(path, json.loads(body or b"{}"))
+                data = json.dumps(payload).encode()
+                reason = "OK" if status == 200 else "Not Found"
+                head = f"HTTP/1.1 {status} {reason}\r\nContent-Type: application/json\r\nContent-Length: {len(data)}\r\n\r\n"
+                writer.write(head.encode() + data)
+                await writer.drain()
+        except (OSError, asyncio.IncompleteReadError, ValueError, IndexError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, socket_path):
+        if os.path.exists(socket_path):
+            os.remove(socket_path)
+        server = await asyncio.start_unix_server(self.handle, path=socket_path)
+        print(f"Stub host-commands service listening on {socket_path}", file=sys.stderr)
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            if os.path.exists(socket_path):
+                os.remove(socket_path)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Run host-commands tasks and wait for their completion")
+    parser.add_argument(
+        "commands",
+        nargs="*",
+        default=[BOOTLOADER_FIPS_COMMAND],
+        help=f"CommandName of each task (default: {BOOTLOADER_FIPS_COMMAND})",
+    )
+    parser.add_argument("--socket", default=SOCKET_PATH, help="unix socket of the host-commands service")
+    parser.add_argument(
+        "--timeout-secs",
+        type=int,
+        default=DEFAULT_TIMEOUT_SECS,
+        help="TimeoutSecs sent with every task, polling stops shortly after it",
+    )
+    parser.add_argument("--serve-stub", action="store_true", help="run a local stub service on --socket instead")
+    parser.add_argument("--stub-delay", type=float, default=1.0, help="seconds until a stub task completes")
+    return parser.parse_args()
+
+
+def main():
+    args = parse_args()
+    if args.serve_stub:
+        try:
+            asyncio.run(StubHostCommandsService(args.stub_delay).serve(args.socket))
+        except KeyboardInterrupt:
+            pass
+        return
+
+    try:
+        results = run_commands(args.commands, args.socket, args.timeout_secs)
+    except OSError as e:
+        sys.exit(f"Cannot reach the host-commands service on {args.socket}: {e}")
+    for result in results:
+        print(json.dumps(result))
+    if any(result["status"] != "completed" for result in results):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,15 +2,38 @@
 Memory Pressure Test Script
 
 This script simulates an out-of-memory (OOM) condition by continuously allocating
-increasing amounts of memory until the system runs out of available RAM.
+memory until the system runs out of available RAM.
 
 Mechanism:
-1. Starts by allocating a 256MB block of memory using bytearray
-2. Keeps all allocated blocks in a list to prevent garbage collection
-3. Doubles the size of each new allocation
+1. Allocates memory blocks following the selected strategy (--strategy):
+   - doubling: starts with a 256MB block and doubles each new block (default)
+   - linear:   each block is --step bigger than the previous one
+   - fixed:    every block is --chunk bytes
+   - target-rss: --chunk blocks until RSS reaches --target, then holds it
+2. Optionally touches every page of each block (--touch), so the kernel
+   really commits it as resident memory:
+   - write:    writes one byte per page through a memoryview stride
+   - populate: maps the block with mmap(MAP_POPULATE)
+3. Keeps all allocated blocks in a list to prevent garbage collection
 4. Tracks and displays:
    - Total memory consumed (MB)
    - Time taken for each allocation
+5. A background sampler writes memory telemetry every --sample-interval
+   seconds to a CSV file (--samples-file): RSS/PSS from smaps_rollup,
+   MemAvailable and swap usage from meminfo, memory PSI and the cgroup
+   memory.current, to follow reclaim and pressure up to the OOM
+6. The allocation runs in a worker process while the parent collects its
+   telemetry and latency samples. With --processes N it runs in N workers,
+   each with its own plan (--plan, cycled over the workers), to build
+   pressure on all cores. --cgroup-max puts the workers in a test-owned
+   cgroup v2 with that memory.max, for cgroup-local instead of node-wide
+   pressure.
+   --stop-at-psi / --stop-at-available stop the workers at a pressure
+   threshold instead of running into the OOM killer
+7. Every allocation is timed with perf_counter_ns together with its minor
+   and major page-fault deltas. The samples go into a log2-bucketed latency
+   histogram whose p50/p99/max summary is printed and saved to
+   --histogram-file on exit, SIGTERM, or when workers get OOM-killed
 
 
 Oneliner
@@ -18,9 +41,25 @@ curl -s https://raw.githubusercontent.com/mshlain/test/refs/heads/main/test/memo
 
 """
 
+import argparse
+import copy
+import csv
+import json
 import logging
+import mmap
+import multiprocessing
+import multiprocessing.connection
+import os
+import resource
+import signal
+import sys
+import threading
 import time
 
+MB = 1024 * 1024
+PAGE_SIZE = mmap.PAGESIZE
+SIZE_UNITS = {"K": 1024, "M": MB, "G": 1024 * MB}
+
 
 def setup_logging():
     logging.basicConfig(
@@ -33,24 +72,500 @@ def setup_logging():
     )
 
 
+def parse_size(text):
+    """Parse sizes like 512M, 2G or a plain number of bytes."""
+    text = text.strip().upper().rstrip("B")
+    if text and text[-1] in SIZE_UNITS:
+        return int(float(text[:-1]) * SIZE_UNITS[text[-1]])
+    return int(text)
+
+
+def read_rss():
+    # second field of statm is the resident set size in pages
+    with open("/proc/self/statm", "r") as f:
+        return int(f.read().split()[1]) * PAGE_SIZE
+
+
+def _read_kb_fields(path, names):
+    # "Name:   1234 kB" style files (meminfo, smaps_rollup), values in kB
+    values = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                name, _, rest = line.partition(":")
+                if name in names:
+                    values[name] = int(rest.split()[0])
+    except OSError:
+        pass
+    return values
+
+
+def read_psi(path="/proc/pressure/memory"):
+    """Return {"some_avg10": .., "some_total": .., "full_avg10": .., ...}."""
+    values = {}
+    try:
+        with open(path, "r") as f:
+            for line in f:
+                kind, *fields = line.split()
+                for field in fields:
+                    key, _, value = field.partition("=")
+                    if key in ("avg10", "total"):
+                        values[f"{kind}_{key}"] = float(value) if key == "avg10" else int(value)
+    except OSError:
+        pass
+    return values
+
+
+def own_cgroup_dir():
+    # cgroup v2 entry looks like "0::/user.slice/session-1.scope"
+    try:
+        with open("/proc/self/cgroup", "r") as f:
+            for line in f:
+                if line.startswith("0::"):
+                    return "/sys/fs/cgroup" + line[3:].strip().rstrip("/")
+    except OSError:
+        pass
+    return None
+
+
+def read_cgroup_current(cgroup_dir):
+    if not cgroup_dir:
+        return None
+    try:
+        with open(os.path.join(cgroup_dir, "memory.current"), "r") as f:
+            return int(f.read())
+    except (OSError, ValueError):
+        return None
+
+
+class MemorySampler(threading.Thread):
+    """Background thread writing one CSV row of memory telemetry per interval."""
+
+    FIELDS = [
+        "time_s",
+        "rss_kb",
+        "pss_kb",
+        "mem_available_kb",
+        "swap_used_kb",
+        "psi_some_avg10",
+        "psi_some_total_us",
+        "psi_full_avg10",
+        "psi_full_total_us",
+        "cgroup_current_bytes",
+    ]
+
+    def __init__(self, path, interval, pids=None, cgroup_dir=None):
+        super().__init__(name="memory-sampler", daemon=True)
+        self.path = path
+        self.interval = interval
+        # callable returning the pids to account, the own process by default
+        self.pids = pids or (lambda: [os.getpid()])
+        self.cgroup_dir = cgroup_dir or own_cgroup_dir()
+        self.stopped = threading.Event()
+
+    def sample(self, started):
+        rss = pss = 0
+        for pid in self.pids():
+            rollup = _read_kb_fields(f"/proc/{pid}/smaps_rollup", ("Rss", "Pss"))
+            rss += rollup.get("Rss", 0)
+            pss += rollup.get("Pss", 0)
+
+        meminfo = _read_kb_fields("/proc/meminfo", ("MemAvailable", "SwapTotal", "SwapFree"))
+        psi = read_psi()
+        return [
+            f"{time.monotonic() - started:.3f}",
+            rss,
+            pss,
+            meminfo.get("MemAvailable", ""),
+            meminfo.get("SwapTotal", 0) - meminfo.get("SwapFree", 0),
+            psi.get("some_avg10", ""),
+            psi.get("some_total", ""),
+            psi.get("full_avg10", ""),
+            psi.get("full_total", ""),
+            read_cgroup_current(self.cgroup_dir) or "",
+        ]
+
+    def run(self):
+        started = time.monotonic()
+        with open(self.path, "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(self.FIELDS)
+            while not self.stopped.is_set():
+                writer.writerow(self.sample(started))
+                # flushed every row, so the series survives an OOM kill
+                f.flush()
+                self.stopped.wait(self.interval)
+
+    def stop(self):
+        self.stopped.set()
+        self.join()
+
+
+def allocation_plan(args):
+    """Yield the size of every block to allocate, according to the strategy."""
+    if args.strategy == "doubling":
+        size = args.start
+        while True:
+            yield size
+            size *= 2
+
+    elif args.strategy == "linear":
+        size = args.start
+        while True:
+            yield size
+            size += args.step
+
+    elif args.strategy == "fixed":
+        while True:
+            yield args.chunk
+
+    elif args.strategy == "target-rss":
+        while read_rss() < args.target:
+            yield min(args.chunk, max(args.target - read_rss(), PAGE_SIZE))
+
+    else:
+        raise ValueError(f"Unknown strategy: {args.strategy}")
+
+
+def touch_pages(block):
+    # one byte per page is enough to fault the whole page in
+    view = memoryview(block)
+    pages = len(range(0, len(block), PAGE_SIZE))
+    view[::PAGE_SIZE] = b"\x01" * pages
+    view.release()
+
+
+def allocate(size, touch):
+    if touch == "populate":
+        if hasattr(mmap, "MAP_POPULATE"):
+            flags = mmap.MAP_PRIVATE | mmap.MAP_ANONYMOUS | mmap.MAP_POPULATE
+            return mmap.mmap(-1, size, flags=flags)
+        # MAP_POPULATE is Linux only (python 3.10+), fall back to writing
+        block = mmap.mmap(-1, size)
+        touch_pages(block)
+        return block
+
+    block = bytearray(size)
+    if touch == "write":
+        touch_pages(block)
+    return block
+
+
+def hold(label=""):
+    logging.info(f"{label}Target reached, RSS: {read_rss() / MB:.0f}MB, holding (Ctrl+C to stop)")
+    while True:
+        time.sleep(60)
+
+
+class LatencyHistogram:
+    """Allocation latencies in power-of-two nanosecond buckets, plus page faults."""
+
+    def __init__(self):
+        # bucket i holds latencies in [2**(i-1), 2**i) ns
+        self.buckets = [0] * 64
+        self.count = 0
+        self.max_ns = 0
+        self.minor_faults = 0
+        self.major_faults = 0
+
+    def record(self, latency_ns, minor_faults, major_faults):
+        self.buckets[min(latency_ns.bit_length(), 63)] += 1
+        self.count += 1
+        self.max_ns = max(self.max_ns, latency_ns)
+        self.minor_faults += minor_faults
+        self.major_faults += major_faults
+
+    def percentile_ns(self, percent):
+        """Upper bound of the bucket holding the given percentile."""
+        if not self.count:
+            return 0
+        rank = self.count * percent / 100
+        seen = 0
+        for index, bucket_count in enumerate(self.buckets):
+            seen += bucket_count
+            if seen >= rank:
+                return min(2**index, self.max_ns)
+        return self.max_ns
+
+    def summary(self):
+        return {
+            "allocations": self.count,
+            "p50_ms": self.percentile_ns(50) / 1e6,
+            "p99_ms": self.percentile_ns(99) / 1e6,
+            "max_ms": self.max_ns / 1e6,
+            "minor_faults": self.minor_faults,
+            "major_faults": self.major_faults,
+            "buckets_ns": {f"<{2**i}": n for i, n in enumerate(self.buckets) if n},
+        }
+
+    def report(self, path):
+        summary = self.summary()
+        logging.info(
+            f"Allocation latency: {summary['allocations']} allocations, "
+            f"p50: {summary['p50_ms']:.3f}ms, p99: {summary['p99_ms']:.3f}ms, "
+            f"max: {summary['max_ms']:.3f}ms, minor faults: {summary['minor_faults']}, "
+            f"major faults: {summary['major_faults']}"
+        )
+        with open(path, "w") as f:
+            json.dump(summary, f, indent=2)
+        logging.info(f"Latency histogram saved to {path}")
+
+
+def _exit_on_sigterm():
+    # turns SIGTERM into SystemExit, so finally blocks still report
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(128 + signum))
+
+
+def run_allocations(plan, touch, label="", on_sample=None):
+    blocks = []
+    total = 0
+
+    for size in allocation_plan(plan):
+        usage_before = resource.getrusage(resource.RUSAGE_SELF)
+        start = time.perf_counter_ns()
+        blocks.append(allocate(size, touch))
+        latency_ns = time.perf_counter_ns() - start
+        usage_after = resource.getrusage(resource.RUSAGE_SELF)
+        minor_faults = usage_after.ru_minflt - usage_before.ru_minflt
+        major_faults = usage_after.ru_majflt - usage_before.ru_majflt
+        total += size
+        if on_sample:
+            on_sample(latency_ns, minor_faults, major_faults)
+        logging.info(
+            f"{label}Memory: {total / MB:.0f}MB, Allocation time: {latency_ns / 1e9:.2f}s, "
+            f"minor faults: {minor_faults}, major faults: {major_faults}"
+        )
+
+    hold(label)
+
+
+def parse_plan(spec, defaults):
+    """Build a worker plan from "strategy[,key=size...]", e.g. "linear,start=64M,step=32M"."""
+    strategy, *overrides = spec.split(",")
+    plan = copy.copy(defaults)
+    plan.strategy = strategy
+    for override in overrides:
+        key, _, value = override.partition("=")
+        if key not in ("start", "step", "chunk", "target"):
+            raise ValueError(f"Unknown plan option: {key}")
+        setattr(plan, key, parse_size(value))
+    if plan.strategy == "target-rss" and not plan.target:
+        raise ValueError(f"Plan {spec} requires target=")
+    return plan
+
+
+class TestCgroup:
+    """A cgroup v2 owned by this test run, removed again on cleanup."""
+
+    def __init__(self, parent, memory_max):
+        self.path = os.path.join(parent, f"memory-pressure-{os.getpid()}")
+        self.memory_max = memory_max
+
+    def _write(self, name, value, base=None):
+        with open(os.path.join(base or self.path, name), "w") as f:
+            f.write(str(value))
+
+    def create(self):
+        parent = os.path.dirname(self.path)
+        try:
+            self._write("cgroup.subtree_control", "+memory", base=parent)
+        except OSError:
+            pass  # already enabled, or managed by systemd
+        os.mkdir(self.path)
+        try:
+            self._write("memory.max", self.memory_max)
+        except OSError:
+            # the caller only cleans up a cgroup that was fully created
+            self.remove()
+            raise
+        # no swap, so pressure in the cgroup leads to reclaim and OOM only
+        try:
+            self._write("memory.swap.max", 0)
+        except OSError:
+            pass
+
+    def add_self(self):
+        self._write("cgroup.procs", os.getpid())
+
+    def remove(self):
+        try:
+            os.rmdir(self.path)
+        except OSError as e:
+            logging.warning(f"Could not remove cgroup {self.path}: {e}")
+
+
+def worker_main(index, plan, touch, cgroup, samples):
+    _exit_on_sigterm()
+    label = f"[worker {index}] "
+    if cgroup:
+        # joins before allocating, so every byte is charged to the test cgroup
+        cgroup.add_self()
+    logging.info(f"{label}pid: {os.getpid()}, strategy: {plan.strategy}")
+    # every sample is written to the pipe before the next allocation, unlike
+    # a Queue nothing waits in a feeder thread when the OOM killer SIGKILLs us
+    run_allocations(plan, touch, label, on_sample=lambda *sample: samples.send(sample))
+
+
+def _drain_samples(receivers, histogram):
+    """Record the samples the workers have sent so far; pipes of exited workers are dropped."""
+    for receiver in multiprocessing.connection.wait(receivers, timeout=0):
+        try:
+            while receiver.poll():
+                histogram.record(*receiver.recv())
+        except EOFError:
+            receivers.remove(receiver)
+            receiver.close()
+
+
+def pressure_reached(args, cgroup):
+    if args.stop_at_psi is not None:
+        psi_path = os.path.join(cgroup.path, "memory.pressure") if cgroup else "/proc/pressure/memory"
+        some_avg10 = read_psi(psi_path).get("some_avg10")
+        if some_avg10 is not None and some_avg10 >= args.stop_at_psi:
+            return f"memory PSI some avg10 {some_avg10} >= {args.stop_at_psi}"
+
+    if args.stop_at_available is not None:
+        available = _read_kb_fields("/proc/meminfo", ("MemAvailable",)).get("MemAvailable")
+        if available is not None and available * 1024 <= args.stop_at_available:
+            return f"MemAvailable {available // 1024}MB <= {args.stop_at_available // MB}MB"
+
+    return None
+
+
+def run_workers(args):
+    plans = [parse_plan(spec, args) for spec in args.plan] or [args]
+    cgroup = None
+    if args.cgroup_max:
+        cgroup = TestCgroup(args.cgroup_parent, args.cgroup_max)
+        cgroup.create()
+        logging.info(f"Created cgroup {cgroup.path} with memory.max {args.cgroup_max // MB}MB")
+
+    # fork, not the spawn/forkserver default of newer Pythons: the piped
+    # one-liner has no __main__ file the workers could re-import
+    context = multiprocessing.get_context("fork")
+    workers = []
+    sampler = None
+    receivers = []
+    histogram = LatencyHistogram()
+    try:
+        for index in range(args.processes):
+            plan = plans[index % len(plans)]
+            receiver, sender = context.Pipe(duplex=False)
+            worker = context.Process(
+                target=worker_main, args=(index, plan, args.touch, cgroup, sender), daemon=True
+            )
+            worker.start()
+            # only the worker holds the sending end, its exit shows as EOF
+            sender.close()
+            workers.append(worker)
+            receivers.append(receiver)
+
+        if args.sample_interval > 0:
+            sampler = MemorySampler(
+                args.samples_file,
+                args.sample_interval,
+                pids=lambda: [w.pid for w in workers if w.is_alive()],
+                cgroup_dir=cgroup.path if cgroup else None,
+            )
+            sampler.start()
+
+        while any(w.is_alive() for w in workers):
+            _drain_samples(receivers, histogram)
+            reason = pressure_reached(args, cgroup)
+            if reason:
+                logging.info(f"Pressure threshold reached: {reason}, stopping workers")
+                break
+            time.sleep(0.2)
+    finally:
+        for worker in workers:
+            if worker.is_alive():
+                worker.terminate()
+        # workers are drained before join, a worker blocked on a full
+        # pipe does not exit before its samples are read
+        while any(w.is_alive() for w in workers):
+            _drain_samples(receivers, histogram)
+            time.sleep(0.05)
+        _drain_samples(receivers, histogram)
+        for index, worker in enumerate(workers):
+            worker.join()
+            # -9 without a threshold stop means the OOM killer got it
+            logging.info(f"[worker {index}] exit code: {worker.exitcode}")
+        if sampler:
+            sampler.stop()
+        if cgroup:
+            cgroup.remove()
+        histogram.report(args.histogram_file)
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description="Memory pressure / OOM reproduction")
+    parser.add_argument(
+        "--strategy",
+        choices=["doubling", "linear", "fixed", "target-rss"],
+        default="doubling",
+        help="how the size of each new block is chosen",
+    )
+    parser.add_argument("--start", type=parse_size, default=256 * MB, help="first block size (doubling, linear)")
+    parser.add_argument("--step", type=parse_size, default=256 * MB, help="block size increment (linear)")
+    parser.add_argument("--chunk", type=parse_size, default=256 * MB, help="block size (fixed, target-rss)")
+    parser.add_argument("--target", type=parse_size, help="RSS to reach and hold (target-rss)")
+    parser.add_argument(
+        "--touch",
+        choices=["none", "write", "populate"],
+        default="none",
+        help="fault in every page of each block so it becomes resident",
+    )
+    parser.add_argument(
+        "--sample-interval",
+        type=float,
+        default=0.5,
+        help="seconds between telemetry samples, 0 disables the sampler",
+    )
+    parser.add_argument(
+        "--samples-file",
+        default="memory.pressure.samples.csv",
+        help="CSV file receiving the telemetry samples",
+    )
+    parser.add_argument("--processes", type=int, default=1, help="number of allocating worker processes")
+    parser.add_argument(
+        "--plan",
+        action="append",
+        default=[],
+        help="per-worker plan 'strategy[,start=..][,step=..][,chunk=..][,target=..]', "
+        "repeatable and cycled over the workers, defaults to the options above",
+    )
+    parser.add_argument("--cgroup-max", type=parse_size, help="run the workers in a new cgroup v2 with this memory.max")
+    parser.add_argument("--cgroup-parent", default="/sys/fs/cgroup", help="where the test cgroup is created")
+    parser.add_argument("--stop-at-psi", type=float, help="stop when memory PSI some avg10 reaches this value")
+    parser.add_argument("--stop-at-available", type=parse_size, help="stop when MemAvailable drops to this size")
+    parser.add_argument(
+        "--histogram-file",
+        default="memory.pressure.histogram.json",
+        help="where the allocation latency summary is saved on exit",
+    )
+    args = parser.parse_args()
+    if args.strategy == "target-rss" and not args.target:
+        parser.error("--strategy target-rss requires --target")
+    return args
+
+
 def main():
+    args = parse_args()
     setup_logging()
     print(__doc__.strip())
     print("-" * 80)  # Add a separator line
     logging.info("")
-    logging.info("Starting memory pressure test")
+    logging.info(
+        f"Starting memory pressure test, strategy: {args.strategy}, touch: {args.touch}, pid: {os.getpid()}"
+    )
 
-    size = 256 * 1024 * 1024  # Start with 256MB
-    blocks = []
+    if args.sample_interval > 0:
+        logging.info(f"Sampling memory telemetry every {args.sample_interval}s to {args.samples_file}")
 
-    while True:
-        start = time.time()
-        blocks.append(bytearray(size))
-        size *= 2
-        total_mem = sum(len(b) for b in blocks) / (1024 * 1024)
-        logging.info(
-            f"Memory: {total_mem:.0f}MB, Allocation time: {time.time() - start:.2f}s"
-        )
+    _exit_on_sigterm()
+    # even a single allocation runs in a worker: the OOM killer SIGKILLs the
+    # allocating process, the parent survives to write the histogram
+    run_workers(args)
 
 
 if __name__ == "__main__":
@@ -6,11 +6,21 @@
 # sudo python3 ./static.ip.locker.py
 
 
+import argparse
+import difflib
+import hashlib
+import json
 import logging
 import os
+import select
+import shlex
 import shutil
+import socket
+import struct
 import subprocess
 import sys
+import tempfile
+import time
 from datetime import datetime, timezone
 
 # network:
@@ -38,8 +48,11 @@ from datetime import datetime, timezone
 #     dns-nameservers 10.171.240.3
 
 class ToolInfra:
+    CMD_TIMEOUT_SECONDS = 30
+
     def __init__(self):
-        pass
+        self.logger = logging.getLogger("static.ip.locker")
+        self.timings = []
 
     def setup_logging(self):
         logger = logging.getLogger("static.ip.locker")
@@ -67,14 +80,22 @@ class ToolInfra:
         logger.setLevel(logging.INFO)
         return logger
 
-    def run_cmd(self, cmd, IgnoreReturnCode=False):
+    def _record_timing(self, cmd: str, started: float):
+        elapsed = time.perf_counter() - started
+        self.timings.append((cmd, elapsed))
+        self.logger.info(f"Command '{cmd}' took {elapsed:.3f}s")
+
+    def run_cmd(self, cmd: list, IgnoreReturnCode=False, timeout=CMD_TIMEOUT_SECONDS):
+        """Run an argv list directly, without a shell, within a timeout."""
+        cmd_str = shlex.join(cmd)
+        started = time.perf_counter()
         try:
-            result = subprocess.run(cmd, capture_output=True, text=True, shell=True)
+            result = subprocess.run(cmd, capture_output=True, text=True, timeout=timeout)
             stderr = result.stderr.strip()
             stdout = result.stdout.strip()
 
             if result.returncode != 0 and not IgnoreReturnCode:
-                msg = f"Command '{cmd}' failed with return code {result.returncode}"
+                msg = f"Command '{cmd_str}' failed with return code {result.returncode}"
                 msg += f"\n  STDOUT: {stdout}"
                 msg += f"\n  STDERR: {stderr}"
                 raise Exception(msg)
@@ -84,16 +105,269 @@ class ToolInfra:
 
             return stderr + "\n" + stdout
 
+        except subprocess.TimeoutExpired:
+            return f"Error: Command '{cmd_str}' timed out after {timeout}s"
         except Exception as e:
             return f"Error: {e}"
+        finally:
+            self._record_timing(cmd_str, started)
 
+    def read_file(self, path: str) -> str:
+        """Read a plain file in-process instead of spawning cat."""
+        started = time.perf_counter()
+        try:
+            with open(path, 'r') as f:
+                return f.read()
+        except OSError as e:
+            return f"Error: {e}"
+        finally:
+            self._record_timing(f"read {path}", started)
 
-class Config:
-    def nic_name(self):
-        return "ens160"
+    def write_file_atomic(self, path: str, content: str, mode=0o644):
+        """Write through a temp file in the same directory, fsync and rename over path."""
+        directory = os.path.dirname(path)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix=f".{os.path.basename(path)}.")
+        try:
+            with os.fdopen(fd, 'w') as f:
+                f.write(content)
+                f.flush()
+                os.fsync(f.fileno())
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+
+        # persist the rename itself
+        dir_fd = os.open(directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+
+    def read_network_snapshot(self) -> "NetlinkSnapshot":
+        """Read links, addresses and routes in one netlink pass."""
+        started = time.perf_counter()
+        try:
+            return NetlinkSnapshot.read()
+        finally:
+            self._record_timing("netlink snapshot", started)
+
+
+class NetlinkSnapshot:
+    """Links, IPv4 addresses and IPv4 routes dumped over one rtnetlink socket.
+
+    All values come from the same moment, no `ip` process is spawned and no
+    text output is parsed.
+    """
+
+    # linux/netlink.h, linux/rtnetlink.h, linux/if_addr.h
+    NLMSG_ERROR = 2
+    NLMSG_DONE = 3
+    NLM_F_REQUEST = 0x1
+    NLM_F_DUMP = 0x300
+    RTM_NEWLINK = 16
+    RTM_GETLINK = 18
+    RTM_NEWADDR = 20
+    RTM_GETADDR = 22
+    RTM_NEWROUTE = 24
+    RTM_GETROUTE = 26
+    IFLA_IFNAME = 3
+    IFA_ADDRESS = 1
+    IFA_LOCAL = 2
+    IFA_CACHEINFO = 6
+    IFA_F_PERMANENT = 0x80
+    RTA_DST = 1
+    RTA_OIF = 4
+    RTA_GATEWAY = 5
+    RTA_TABLE = 15
+    RT_TABLE_MAIN = 254
+    IFF_UP = 0x1
+    IFF_LOWER_UP = 0x10000
+    INFINITY_LIFETIME = 0xFFFFFFFF
+
+    NLMSGHDR = struct.Struct("=LHHLL")
+    IFINFOMSG = struct.Struct("=BxHiII")
+    IFADDRMSG = struct.Struct("=BBBBI")
+    RTMSG = struct.Struct("=BBBBBBBBI")
+    RTATTR = struct.Struct("=HH")
 
     def __init__(self):
-        pass
+        # ifindex -> {"name": str, "up": bool, "carrier": bool}
+        self.links = {}
+        # {"ifindex", "address", "prefixlen", "dynamic"}
+        self.addresses = []
+        # {"ifindex", "gateway", "dst", "dst_len", "table"}
+        self.routes = []
+
+    @classmethod
+    def read(cls) -> "NetlinkSnapshot":
+        snapshot = cls()
+        with socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE) as sock:
+            sock.bind((0, 0))
+            for seq, (msg_type, body) in enumerate(
+                [
+                    (cls.RTM_GETLINK, cls.IFINFOMSG.pack(socket.AF_UNSPEC, 0, 0, 0, 0)),
+                    (cls.RTM_GETADDR, cls.IFADDRMSG.pack(socket.AF_INET, 0, 0, 0, 0)),
+                    (cls.RTM_GETROUTE, cls.RTMSG.pack(socket.AF_INET, 0, 0, 0, 0, 0, 0, 0, 0)),
+                ],
+                start=1,
+            ):
+                for reply_type, payload in cls._dump(sock, msg_type, body, seq):
+                    snapshot._parse(reply_type, payload)
+        return snapshot
+
+    @classmethod
+    def _dump(cls, sock, msg_type: int, body: bytes, seq: int):
+        header = cls.NLMSGHDR.pack(cls.NLMSGHDR.size + len(body), msg_type, cls.NLM_F_REQUEST | cls.NLM_F_DUMP, seq, 0)
+        sock.send(header + body)
+        while True:
+            data = sock.recv(65536)
+            offset = 0
+            while offset + cls.NLMSGHDR.size <= len(data):
+                length, reply_type, _, _, _ = cls.NLMSGHDR.unpack_from(data, offset)
+                if reply_type == cls.NLMSG_DONE:
+                    return
+                if reply_type == cls.NLMSG_ERROR:
+                    error = struct.unpack_from("=i", data, offset + cls.NLMSGHDR.size)[0]
+                    raise OSError(-error, f"netlink dump {msg_type} failed: {os.strerror(-error)}")
+                yield reply_type, data[offset + cls.NLMSGHDR.size:offset + length]
+                offset += (length + 3) & ~3
+
+    @classmethod
+    def _attributes(cls, payload: bytes, offset: int) -> dict:
+        attributes = {}
+        while offset + cls.RTATTR.size <= len(payload):
+            length, attr_type = cls.RTATTR.unpack_from(payload, offset)
+            if length < cls.RTATTR.size:
+                break
+            attributes[attr_type] = payload[offset + cls.RTATTR.size:offset + length]
+            offset += (length + 3) & ~3
+        return attributes
+
+    def _parse(self, reply_type: int, payload: bytes):
+        if reply_type == self.RTM_NEWLINK:
+            _, _, index, flags, _ = self.IFINFOMSG.unpack_from(payload)
+            attributes = self._attributes(payload, self.IFINFOMSG.size)
+            name = attributes.get(self.IFLA_IFNAME, b"").rstrip(b"\0").decode()
+            self.links[index] = {
+                "name": name,
+                "up": bool(flags & self.IFF_UP),
+                "carrier": bool(flags & self.IFF_LOWER_UP),
+            }
+
+        elif reply_type == self.RTM_NEWADDR:
+            family, prefixlen, flags, _, index = self.IFADDRMSG.unpack_from(payload)
+            if family != socket.AF_INET:
+                return
+            attributes = self._attributes(payload, self.IFADDRMSG.size)
+            raw = attributes.get(self.IFA_LOCAL) or attributes.get(self.IFA_ADDRESS)
+            if not raw:
+                return
+            valid_lifetime = self.INFINITY_LIFETIME
+            if self.IFA_CACHEINFO in attributes:
+                _, valid_lifetime, _, _ = struct.unpack("=IIII", attributes[self.IFA_CACHEINFO])
+            self.addresses.append(
+                {
+                    "ifindex": index,
+                    "address": socket.inet_ntoa(raw),
+                    "prefixlen": prefixlen,
+                    # leased addresses (DHCP) have a finite lifetime
+                    "dynamic": not (flags & self.IFA_F_PERMANENT)
+                    and valid_lifetime != self.INFINITY_LIFETIME,
+                }
+            )
+
+        elif reply_type == self.RTM_NEWROUTE:
+            family, dst_len, _, _, table, _, _, _, _ = self.RTMSG.unpack_from(payload)
+            if family != socket.AF_INET:
+                return
+            attributes = self._attributes(payload, self.RTMSG.size)
+            if self.RTA_TABLE in attributes:
+                table = struct.unpack("=I", attributes[self.RTA_TABLE])[0]
+            oif = attributes.get(self.RTA_OIF)
+            gateway = attributes.get(self.RTA_GATEWAY)
+            destination = attributes.get(self.RTA_DST)
+            self.routes.append(
+                {
+                    "ifindex": struct.unpack("=i", oif)[0] if oif else None,
+                    "gateway": socket.inet_ntoa(gateway) if gateway else None,
+                    "dst": socket.inet_ntoa(destination) if destination else "0.0.0.0",
+                    "dst_len": dst_len,
+                    "table": table,
+                }
+            )
+
+    def ifindex(self, nic: str) -> int:
+        for index, link in self.links.items():
+            if link["name"] == nic:
+                return index
+        raise Exception(f"Network interface {nic} not found")
+
+    def ipv4_addresses(self, nic: str) -> list:
+        index = self.ifindex(nic)
+        return [a for a in self.addresses if a["ifindex"] == index]
+
+    def default_gateway(self, nic: str):
+        index = self.ifindex(nic)
+        for route in self.routes:
+            if (
+                route["ifindex"] == index
+                and route["dst_len"] == 0
+                and route["gateway"]
+                and route["table"] == self.RT_TABLE_MAIN
+            ):
+                return route["gateway"]
+        return None
+
+
+class NetlinkMonitor:
+    """Subscription to link, IPv4 address and IPv4 route change events."""
+
+    RTMGRP_LINK = 0x1
+    RTMGRP_IPV4_IFADDR = 0x10
+    RTMGRP_IPV4_ROUTE = 0x40
+
+    def __enter__(self):
+        self.sock = socket.socket(socket.AF_NETLINK, socket.SOCK_RAW, socket.NETLINK_ROUTE)
+        self.sock.bind((0, self.RTMGRP_LINK | self.RTMGRP_IPV4_IFADDR | self.RTMGRP_IPV4_ROUTE))
+        self.sock.setblocking(False)
+        return self
+
+    def __exit__(self, *exc_info):
+        self.sock.close()
+
+    def wait(self, timeout: float) -> bool:
+        """Wait up to timeout seconds for events, return True if any arrived."""
+        readable, _, _ = select.select([self.sock], [], [], timeout)
+        if not readable:
+            return False
+        # drain, the caller re-reads the full state anyway
+        try:
+            while self.sock.recv(65536):
+                pass
+        except BlockingIOError:
+            pass
+        return True
+
+
+class Config:
+    def nic_names(self) -> list:
+        return self.nics
+
+    def backup_dir(self):
+        return "/etc/network/interfaces.backups"
+
+    def apply_timeout(self) -> float:
+        return self.apply_timeout_seconds
+
+    def __init__(self, nics=None, all_dhcp=False, backup_retention=10, apply_timeout=30):
+        self.nics = nics or ["ens160"]
+        # lock every interface that currently has a DHCP lease
+        self.all_dhcp = all_dhcp
+        self.backup_retention = backup_retention
+        # how long the applied configuration may take to show up before rollback
+        self.apply_timeout_seconds = apply_timeout
 
 class EthernetConfig:
     def __init__(self):
@@ -113,13 +387,13 @@ class EthernetConfig:
             f")"
         )
     
-    def validate(self):
+    def validate(self, require_gateway=True):
         """Validate the ethernet configuration."""
         if not self.IpAddress:
             raise ValueError("IP Address is required")
         if not self.SubnetMask:
             raise ValueError("Subnet Mask is required")
-        if not self.Gateway:
+        if require_gateway and not self.Gateway:
             raise ValueError("Gateway is required")
         
         return True
@@ -129,55 +403,23 @@ class CurrentEtherentConfigReader:
         self.tool_infra = tool_infra
         self.config = config
 
-    def _read_ip_addr(self, nic: str) -> str:
-        ip_output = self.tool_infra.run_cmd(f"ip addr show {nic}", IgnoreReturnCode=True)
-        for line in ip_output.split('\n'):
-            line = line.strip()
-            if line.startswith('inet ') and not line.startswith('inet6'):
-                # Format: inet 192.168.111.162/24 brd ...
-                parts = line.split()
-                if len(parts) >= 2:
-                    ip_cidr = parts[1]
-                    if '/' in ip_cidr:
-                        ip, cidr = ip_cidr.split('/')
-                        return ip
-                break
+    def _read_ip_addr(self, snapshot: NetlinkSnapshot, nic: str) -> str:
+        addresses = snapshot.ipv4_addresses(nic)
+        if not addresses:
+            raise Exception("IP address not found")
+        return addresses[0]["address"]
 
-        raise Exception("IP address not found")
-    
-    def _read_subnet_mask(self, nic: str) -> str:
-        # Get IP address and subnet mask
-        ip_output = self.tool_infra.run_cmd(f"ip addr show {nic}", IgnoreReturnCode=True)
-        for line in ip_output.split('\n'):
-            line = line.strip()
-            if line.startswith('inet ') and not line.startswith('inet6'):
-                # Format: inet 192.168.111.162/24 brd ...
-                parts = line.split()
-                if len(parts) >= 2:
-                    ip_cidr = parts[1]
-                    if '/' in ip_cidr:
-                        ip, cidr = ip_cidr.split('/')
-                        return self._cidr_to_netmask(int(cidr))
-                break
-        raise Exception("Subnet mask not found")
-    
-    def _read_gateway(self, nic: str) -> str:
-        route_output = self.tool_infra.run_cmd(f"ip route show dev {nic}", IgnoreReturnCode=True)
-        for line in route_output.split('\n'):
-            if 'default via' in line:
-                # Format: default via 192.168.111.254 ...
-                parts = line.split()
-                if 'via' in parts:
-                    via_index = parts.index('via')
-                    if via_index + 1 < len(parts):
-                        return parts[via_index + 1]
-                break
+    def _read_subnet_mask(self, snapshot: NetlinkSnapshot, nic: str) -> str:
+        addresses = snapshot.ipv4_addresses(nic)
+        if not addresses:
+            raise Exception("Subnet mask not found")
+        return self._cidr_to_netmask(addresses[0]["prefixlen"])
 
-        raise Exception("Gateway not found")
-    
     def _read_dns_servers(self) -> list:
         result = []
-        dns_output = self.tool_infra.run_cmd("cat /etc/resolv.conf", IgnoreReturnCode=True)
+        dns_output = self.tool_infra.read_file("/etc/resolv.conf")
+        if dns_output.startswith("Error:"):
+            return result
         for line in dns_output.split('\n'):
             line = line.strip()
             if line.startswith('nameserver'):
@@ -186,71 +428,250 @@ class CurrentEtherentConfigReader:
                     result.append(parts[1])
         return result
 
-    def read(self) -> EthernetConfig:
-        eth_cfg = EthernetConfig()
-        nic = self.config.nic_name()
-        
-        # Get IP address and subnet mask
-        eth_cfg.IpAddress = self._read_ip_addr(nic)
-        eth_cfg.SubnetMask = self._read_subnet_mask(nic)
-        eth_cfg.Gateway = self._read_gateway(nic)
-        eth_cfg.DnsServers = self._read_dns_servers()
-
-        return eth_cfg
+    def _find_dhcp_nics(self, snapshot: NetlinkSnapshot) -> list:
+        """Interfaces holding a leased address or declared 'inet dhcp'."""
+        dhcp_indexes = {a["ifindex"] for a in snapshot.addresses if a["dynamic"]}
+        nics = [link["name"] for index, link in sorted(snapshot.links.items()) if index in dhcp_indexes]
+
+        interfaces_output = self.tool_infra.read_file("/etc/network/interfaces")
+        for line in interfaces_output.split('\n'):
+            parts = line.split()
+            # Format: iface ens192 inet dhcp
+            if parts[:1] == ['iface'] and parts[2:4] == ['inet', 'dhcp'] and parts[1] not in nics:
+                nics.append(parts[1])
+
+        return [nic for nic in nics if nic != "lo"]
+
+    def read_all(self) -> dict:
+        """Read every configured (or DHCP managed) interface from one snapshot."""
+        # a single netlink dump already holds the state of all interfaces,
+        # there is nothing left to read per interface
+        snapshot = self.tool_infra.read_network_snapshot()
+        nics = self._find_dhcp_nics(snapshot) if self.config.all_dhcp else self.config.nic_names()
+        if not nics:
+            raise Exception("No DHCP managed network interface found")
+
+        dns_servers = self._read_dns_servers()
+        result = {}
+        for nic in nics:
+            if self.config.all_dhcp and not snapshot.ipv4_addresses(nic):
+                # auto-detected interface without a lease (e.g. link down), there
+                # is nothing to lock; a NIC named with --nic still fails hard
+                self.tool_infra.logger.warning(f"Skipping {nic}: no IPv4 address")
+                continue
+            eth_cfg = EthernetConfig()
+            eth_cfg.IpAddress = self._read_ip_addr(snapshot, nic)
+            eth_cfg.SubnetMask = self._read_subnet_mask(snapshot, nic)
+            # only the interface(s) carrying the default route have a gateway
+            eth_cfg.Gateway = snapshot.default_gateway(nic)
+            eth_cfg.DnsServers = dns_servers
+            result[nic] = eth_cfg
+
+        if not result:
+            raise Exception("No DHCP managed network interface with an IP address found")
+        if not any(eth_cfg.Gateway for eth_cfg in result.values()):
+            raise Exception("Gateway not found")
+        return result
     
     def _cidr_to_netmask(self, cidr: int) -> str:
         """Convert CIDR notation to dotted decimal subnet mask."""
         mask = (0xffffffff >> (32 - cidr)) << (32 - cidr)
         return f"{(mask >> 24) & 0xff}.{(mask >> 16) & 0xff}.{(mask >> 8) & 0xff}.{mask & 0xff}"
 
+class BackupStore:
+    """Bounded backups of a file, indexed by a manifest and deduplicated by content.
+
+    Layout of the store directory:
+      manifest.json      {"entries": [{"timestamp": ..., "sha256": ...}, ...]}, newest last
+      objects/<sha256>   one copy per distinct content, shared by equal backups
+    """
+
+    def __init__(self, tool_infra: ToolInfra, directory: str, retention: int):
+        self.tool_infra = tool_infra
+        self.directory = directory
+        self.retention = retention
+        self.manifest_file = os.path.join(directory, "manifest.json")
+        self.objects_dir = os.path.join(directory, "objects")
+
+    def entries(self) -> list:
+        """All backups, oldest first."""
+        try:
+            with open(self.manifest_file, 'r') as f:
+                return json.load(f)["entries"]
+        except (OSError, ValueError, KeyError):
+            return []
+
+    def latest(self):
+        entries = self.entries()
+        return entries[-1] if entries else None
+
+    def object_path(self, entry: dict) -> str:
+        return os.path.join(self.objects_dir, entry["sha256"])
+
+    def _store_object(self, content: str) -> str:
+        digest = hashlib.sha256(content.encode()).hexdigest()
+        os.makedirs(self.objects_dir, exist_ok=True, mode=0o755)
+        object_path = os.path.join(self.objects_dir, digest)
+        if not os.path.exists(object_path):
+            self.tool_infra.write_file_atomic(object_path, content)
+        return digest
+
+    def backup(self, path: str):
+        if not os.path.exists(path):
+            return None
+        with open(path, 'r') as f:
+            content = f.read()
+
+        entry = {
+            "timestamp": datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S"),
+            "sha256": self._store_object(content),
+        }
+        entries = self.entries() + [entry]
+        self._save(entries[-self.retention:])
+        return entry
+
+    def import_legacy(self, paths: list):
+        """Take over plain "<file>.backup.<timestamp>" copies, oldest first, and remove them."""
+        legacy_entries = []
+        for path in paths:
+            with open(path, 'r') as f:
+                content = f.read()
+            legacy_entries.append({"timestamp": path.rsplit(".", 1)[-1], "sha256": self._store_object(content)})
+        # they predate every entry of the store
+        entries = legacy_entries + self.entries()
+        self._save(entries[-self.retention:])
+        for path in paths:
+            os.remove(path)
+
+    def restore(self, path: str) -> bool:
+        entry = self.latest()
+        if not entry:
+            return False
+        with open(self.object_path(entry), 'r') as f:
+            content = f.read()
+        # an interrupted restore must not leave a truncated file behind
+        self.tool_infra.write_file_atomic(path, content)
+        return True
+
+    def _save(self, entries: list):
+        self.tool_infra.write_file_atomic(self.manifest_file, json.dumps({"entries": entries}, indent=2))
+        # drop objects no longer referenced by any kept entry
+        referenced = {entry["sha256"] for entry in entries}
+        for name in os.listdir(self.objects_dir):
+            if name not in referenced and not name.startswith("."):
+                os.remove(os.path.join(self.objects_dir, name))
+
+
 class StaticIpWriter:
     def __init__(self, tool_infra: ToolInfra, config: Config):
         self.tool_infra = tool_infra
         self.config = config
+        self.backups = BackupStore(tool_infra, config.backup_dir(), config.backup_retention)
+
+    def write(self, eth_cfgs: dict):
+        """Write static IP configuration of all interfaces to /etc/network/interfaces and apply it.
 
-    def write(self, eth_cfg: EthernetConfig):
-        """Write static IP configuration to /etc/network/interfaces and apply it."""
+        eth_cfgs maps interface name to EthernetConfig, in file order.
+        """
         # Validate configuration before writing
-        eth_cfg.validate()
-        
-        nic = self.config.nic_name()
-        
-        # Backup existing interfaces file
-        self._backup_interfaces_file()
-        
+        for eth_cfg in eth_cfgs.values():
+            eth_cfg.validate(require_gateway=False)
+        if not any(eth_cfg.Gateway for eth_cfg in eth_cfgs.values()):
+            raise ValueError("Gateway is required")
+
         # Build interfaces configuration
-        interfaces_content = self._build_interfaces_config(nic, eth_cfg)
-        
-        # Write to /etc/network/interfaces
+        interfaces_content = self._build_interfaces_config(eth_cfgs)
+
+        # Nothing to do when the file already holds this configuration,
+        # a network restart costs seconds of outage
         interfaces_file = "/etc/network/interfaces"
-        
+        current_content = ""
+        if os.path.exists(interfaces_file):
+            with open(interfaces_file, 'r') as f:
+                current_content = f.read()
+        if current_content == interfaces_content:
+            self.tool_infra.logger.info(f"{interfaces_file} is up to date, skipping write and network restart")
+            return False
+
+        self.tool_infra.logger.info(f"Changes to {interfaces_file}:\n{self._diff(current_content, interfaces_content)}")
+
+        # Backup existing interfaces file
+        self._backup_interfaces_file()
+
+        applied = False
         try:
-            with open(interfaces_file, 'w') as f:
-                f.write(interfaces_content)
-            os.chmod(interfaces_file, 0o644)
-            
+            self.tool_infra.write_file_atomic(interfaces_file, interfaces_content)
+
             # # Write DNS servers to /etc/resolv.conf
             # self._write_dns_config(eth_cfg.DnsServers)
-            
-            # Restart networking to apply changes
-            self._apply_network_config(nic)
-            
+
+            # Restart networking to apply changes, all interfaces at once,
+            # and wait until the kernel state shows them
+            applied = True
+            self._apply_and_verify(eth_cfgs)
+
         except Exception as e:
             # Restore backup on failure
-            self._restore_interfaces_backup()
+            rollback_started = time.perf_counter()
+            if not self._restore_interfaces_backup():
+                raise Exception(f"Failed to write network configuration: {e}; no backup to roll back to")
+            if applied:
+                # the previous configuration held the same addresses, it has to
+                # pass the same verification before the rollback counts
+                try:
+                    self._apply_and_verify(eth_cfgs)
+                except Exception as rollback_error:
+                    raise Exception(
+                        f"Failed to write network configuration: {e}; "
+                        f"the rolled back configuration did not come up either: {rollback_error}"
+                    )
+            self.tool_infra.logger.warning(
+                f"Rolled back to the previous configuration in {time.perf_counter() - rollback_started:.2f}s"
+            )
             raise Exception(f"Failed to write network configuration: {e}")
-    
-    def _build_interfaces_config(self, nic: str, eth_cfg: EthernetConfig) -> str:
-        dns_nameservers_value = ' '.join(eth_cfg.DnsServers) if eth_cfg.DnsServers else '8.8.8.8' 
 
+        return True
+
+    def _diff(self, old_content: str, new_content: str) -> str:
+        diff = difflib.unified_diff(
+            old_content.splitlines(keepends=True),
+            new_content.splitlines(keepends=True),
+            fromfile="/etc/network/interfaces (current)",
+            tofile="/etc/network/interfaces (new)",
+        )
+        return "".join(diff)
+
+    def _build_interfaces_config(self, eth_cfgs: dict) -> str:
         """Build the content for /etc/network/interfaces file."""
-        config = f"""# This file describes the network interfaces available on your system
+        config = """# This file describes the network interfaces available on your system
 # and how to activate them. For more information, see interfaces(5).
 
 # The loopback network interface
 auto lo
 iface lo inet loopback
+"""
+        # the first interface with a gateway is the primary one, a second
+        # gateway line would install a competing default route
+        primary_nic = next(nic for nic, eth_cfg in eth_cfgs.items() if eth_cfg.Gateway)
+        config += self._build_interface_stanza(primary_nic, eth_cfgs[primary_nic], primary=True)
+        for nic, eth_cfg in eth_cfgs.items():
+            if nic != primary_nic:
+                config += self._build_interface_stanza(nic, eth_cfg, primary=False)
 
+        return config
+
+    def _build_interface_stanza(self, nic: str, eth_cfg: EthernetConfig, primary: bool) -> str:
+        if not primary:
+            return f"""
+# Secondary network interface
+auto {nic}
+iface {nic} inet static
+    address {eth_cfg.IpAddress}
+    netmask {eth_cfg.SubnetMask}
+"""
+
+        dns_nameservers_value = ' '.join(eth_cfg.DnsServers) if eth_cfg.DnsServers else '8.8.8.8'
+        return f"""
 # The primary network interface
 auto {nic}
 iface {nic} inet static
@@ -260,8 +681,6 @@ iface {nic} inet static
     dns-nameservers {dns_nameservers_value}
 """
 
-        return config
-    
     def _write_dns_config(self, dns_servers: list):
         """Write DNS servers to /etc/resolv.conf."""
         if not dns_servers:
@@ -282,47 +701,99 @@ iface {nic} inet static
         
         os.chmod(resolv_file, 0o644)
     
-    def _apply_network_config(self, nic: str):
-        """Apply the network configuration by restarting the interface."""
-        # Bring interface down and up to apply new configuration
-        self.tool_infra.run_cmd(f"sudo ifdown {nic} && sudo ifup {nic}", IgnoreReturnCode=True)
+    def _apply_network_config(self, nics: list):
+        """Apply the network configuration by restarting the interfaces."""
+        # Bring all interfaces down and up in one transaction to apply new configuration
+        self.tool_infra.run_cmd(["sudo", "ifdown"] + nics, IgnoreReturnCode=True)
+        self.tool_infra.run_cmd(["sudo", "ifup"] + nics, IgnoreReturnCode=True)
+
+    def _apply_and_verify(self, eth_cfgs: dict):
+        """Apply the configuration and wait until link, address and default route are back."""
+        started = time.perf_counter()
+        deadline = started + self.config.apply_timeout()
+        # subscribe before ifdown/ifup, so no change event can be missed
+        with NetlinkMonitor() as monitor:
+            self._apply_network_config(list(eth_cfgs))
+            applied = time.perf_counter()
+            self.tool_infra.logger.info(f"ifdown/ifup took {applied - started:.2f}s, verifying")
+
+            while True:
+                pending = self._unconfirmed(NetlinkSnapshot.read(), eth_cfgs)
+                now = time.perf_counter()
+                if not pending:
+                    self.tool_infra.logger.info(
+                        f"Network configuration confirmed {now - applied:.2f}s after ifup "
+                        f"({now - started:.2f}s in total)"
+                    )
+                    return
+                if now >= deadline:
+                    raise TimeoutError(
+                        f"Network configuration not confirmed within {self.config.apply_timeout()}s: "
+                        + ", ".join(pending)
+                    )
+                # wake up on the next netlink event, or poll again shortly
+                monitor.wait(min(deadline - now, 0.2))
+
+    def _unconfirmed(self, snapshot: NetlinkSnapshot, eth_cfgs: dict) -> list:
+        """Describe what of eth_cfgs is not yet visible in snapshot."""
+        pending = []
+        for nic, eth_cfg in eth_cfgs.items():
+            try:
+                link = snapshot.links[snapshot.ifindex(nic)]
+                addresses = snapshot.ipv4_addresses(nic)
+                gateway = snapshot.default_gateway(nic)
+            except Exception:
+                pending.append(f"{nic} missing")
+                continue
+            if not (link["up"] and link["carrier"]):
+                pending.append(f"{nic} link down")
+            expected_prefix = bin(int.from_bytes(socket.inet_aton(eth_cfg.SubnetMask), "big")).count("1")
+            if not any(
+                a["address"] == eth_cfg.IpAddress and a["prefixlen"] == expected_prefix for a in addresses
+            ):
+                pending.append(f"{nic} address {eth_cfg.IpAddress}/{expected_prefix} missing")
+            if eth_cfg.Gateway and gateway != eth_cfg.Gateway:
+                pending.append(f"{nic} default route via {eth_cfg.Gateway} missing")
+        return pending
     
     def _backup_interfaces_file(self):
         """Backup the existing /etc/network/interfaces file."""
-        interfaces_file = "/etc/network/interfaces"
-        
-        if os.path.exists(interfaces_file):
-            timestamp = datetime.now(timezone.utc).strftime("%Y%m%d_%H%M%S")
-            backup_file = f"{interfaces_file}.backup.{timestamp}"
-            shutil.copy2(interfaces_file, backup_file)
-    
-    def _restore_interfaces_backup(self):
-        """Restore the most recent backup of /etc/network/interfaces."""
-        interfaces_file = "/etc/network/interfaces"
-        
-        # Find most recent backup
-        backup_files = [f for f in os.listdir("/etc/network") if f.startswith("interfaces.backup.")]
-        
-        if backup_files:
-            backup_files.sort(reverse=True)
-            latest_backup = f"/etc/network/{backup_files[0]}"
-            shutil.copy2(latest_backup, interfaces_file)
+        # copies made before the backup store existed are moved into it once,
+        # so retention covers them too
+        legacy_files = sorted(
+            os.path.join("/etc/network", name)
+            for name in os.listdir("/etc/network")
+            if name.startswith("interfaces.backup.")
+        )
+        if legacy_files:
+            self.backups.import_legacy(legacy_files)
+            self.tool_infra.logger.info(f"Moved {len(legacy_files)} legacy backups into {self.backups.directory}")
+
+        entry = self.backups.backup("/etc/network/interfaces")
+        if entry:
+            self.tool_infra.logger.info(f"Backed up /etc/network/interfaces as {entry['sha256'][:12]} ({entry['timestamp']})")
+
+    def _restore_interfaces_backup(self) -> bool:
+        """Restore the most recent backup of /etc/network/interfaces, False when there is none."""
+        # legacy interfaces.backup.* copies were imported by _backup_interfaces_file
+        return self.backups.restore("/etc/network/interfaces")
 
 
 class App:
-    def __init__(self):
+    def __init__(self, nics=None, all_dhcp=False, backup_retention=10, apply_timeout=30):
         self.tool_infra = ToolInfra()
         self.logger = self.tool_infra.setup_logging()
-        self.config = Config()
+        self.config = Config(nics, all_dhcp, backup_retention, apply_timeout)
 
     def run_impl(self):
         reader = CurrentEtherentConfigReader(self.tool_infra, self.config)
-        current_cfg = reader.read()
-        print("Current Ethernet Configuration:")
-        print(current_cfg)
+        current_cfgs = reader.read_all()
+        for nic, current_cfg in current_cfgs.items():
+            print(f"Current Ethernet Configuration of {nic}:")
+            print(current_cfg)
 
         writer = StaticIpWriter(self.tool_infra, self.config)
-        writer.write(current_cfg)
+        writer.write(current_cfgs)
 
     def run(self):
         try:
@@ -338,9 +809,42 @@ class App:
 
         return 1
 
+def parse_args():
+    parser = argparse.ArgumentParser(description="Lock the current DHCP addresses as static configuration")
+    parser.add_argument(
+        "--nic",
+        action="append",
+        dest="nics",
+        help="interface to lock, repeatable (default: ens160)",
+    )
+    parser.add_argument(
+        "--all-dhcp",
+        action="store_true",
+        help="lock every interface that currently has a DHCP lease or is declared 'inet dhcp'",
+    )
+    parser.add_argument(
+        "--backup-retention",
+        type=int,
+        default=10,
+        help="number of /etc/network/interfaces backups to keep",
+    )
+    parser.add_argument(
+        "--apply-timeout",
+        type=float,
+        default=30,
+        help="seconds to wait for the new configuration to come up before rolling back",
+    )
+    args = parser.parse_args()
+    # entries[-retention:] keeps everything for 0 and drops the newest when negative
+    if args.backup_retention < 1:
+        parser.error("--backup-retention must be at least 1")
+    return args
+
+
 if __name__ == "__main__":
     # fail_if_no_sudo()
-    app = App()
+    args = parse_args()
+    app = App(args.nics, args.all_dhcp, args.backup_retention, args.apply_timeout)
     sys.exit(app.run())
 
 # run with